@@ -0,0 +1,102 @@
+"""Offline batch jobs in the JSONL format of OpenAI-compatible batch APIs.
+
+A batch consists of two files:
+
+- `<name>.jsonl`: one request per line, ready to be uploaded
+- `<name>.xml`: the manifest, i.e. all queries in order (including skipped
+  ones) without results, used by `dantetool batch-ingest`
+
+The `custom_id` of each request is its index in the manifest followed by
+the query info.  The request names the model without the llm7shi provider
+prefix (e.g. `gemma-3-27b-it` for `google:gemma-3-27b-it`), and the full
+spec is kept in the `model` attribute of the query in the manifest.
+"""
+
+import os, json
+from . import common
+
+url = "/v1/chat/completions"
+
+class writer:
+    def __init__(self, path):
+        self.path = path
+        self.manifest = os.path.splitext(path)[0] + ".xml"
+        self.qs = []
+        self.file = open(path, "w", encoding="utf-8")
+
+    def add(self, config, prefix, jobs):
+        """Append `(prompt, info, check)` jobs asked after the `prefix` messages.
+
+        Checks cannot run offline and are ignored; `common.query` objects go
+        to the manifest only."""
+        for job in jobs:
+            if isinstance(job, common.query):
+                self.qs.append(job)
+                continue
+            prompt, info, _ = job
+            q = common.query()
+            q.prompt = prompt.replace("\r\n", "\n").rstrip()
+            q.info = info.strip() if info else None
+            q.metrics["model"] = config["model"]
+            messages = prefix + [{"role": "user", "content": q.prompt}]
+            custom_id = f"{len(self.qs):06d} {q.info or ''}".rstrip()
+            self.file.write(json.dumps(make_request(config, messages, custom_id), ensure_ascii=False) + "\n")
+            self.qs.append(q)
+
+    def close(self):
+        self.file.close()
+        common.write_queries(self.manifest, self.qs, count=len(self.qs))
+        requests = sum(1 for q in self.qs if not q.error)
+        print(f"{self.path}: {requests} requests, {self.manifest}: {len(self.qs)} queries")
+
+def api_model(spec):
+    """Strip the provider prefix of an llm7shi model spec, e.g.
+    `ollama:gpt-oss:120b` -> `gpt-oss:120b`."""
+    return spec.split(":", 1)[1] if ":" in spec else spec
+
+def make_request(config, messages, custom_id):
+    body = {"model": api_model(config["model"]), "messages": messages}
+    if "temperature" in config:
+        body["temperature"] = config["temperature"]
+    if "max_length" in config:
+        body["max_tokens"] = config["max_length"]
+    return {"custom_id": custom_id, "method": "POST", "url": url, "body": body}
+
+def make_result(custom_id, text=None, error=None):
+    if text is None:
+        return {"custom_id": custom_id, "response": None,
+                "error": {"code": "error", "message": error}}
+    body = {"choices": [{"index": 0, "message": {"role": "assistant", "content": text}}]}
+    return {"custom_id": custom_id, "response": {"status_code": 200, "body": body}, "error": None}
+
+def read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def parse_result(r):
+    """Return `(text, error)` from one line of a batch result file."""
+    if error := r.get("error"):
+        return None, error.get("message") or str(error)
+    response = r.get("response") or {}
+    if (status := response.get("status_code", 200)) != 200:
+        return None, f"status {status}: {json.dumps(response.get('body'), ensure_ascii=False)}"
+    body = response.get("body") or {}
+    try:
+        return body["choices"][0]["message"]["content"], None
+    except (KeyError, IndexError, TypeError):
+        return None, f"no content: {json.dumps(body, ensure_ascii=False)}"
+
+def read_models(manifest):
+    """Map manifest index to the full model spec."""
+    return {i: q.metrics["model"] for i, q in enumerate(common.iter_queries(manifest))
+            if "model" in q.metrics}
+
+def read_results(path):
+    """Map manifest index to `(text, error)`."""
+    ret = {}
+    for r in read_jsonl(path):
+        index = int(r["custom_id"].split(" ", 1)[0])
+        ret[index] = parse_result(r)
+    return ret
@@ -0,0 +1,90 @@
+import os, json, hashlib, threading
+
+# On-disk LLM response cache, keyed on the request content.
+enabled = True
+directory = os.path.join(os.path.expanduser("~"), ".cache", "dantetool", "responses")
+max_size = 1 << 30  # bytes; least recently used entries are evicted beyond this
+
+keys = ["model", "temperature", "max_length", "include_thoughts"]
+
+lock = threading.Lock()
+total_size = None
+
+def add_args(parser):
+    parser.add_argument("--no-cache", dest="cache", action="store_false", default=True,
+                        help="don't use the response cache")
+    parser.add_argument("--cache-dir", dest="cache_dir", type=str, default=directory,
+                        help=f"specify cache directory (default: {directory})")
+
+def apply(args):
+    global enabled, directory
+    enabled = args.cache
+    directory = args.cache_dir
+
+def make_key(config, messages):
+    data = {k: config.get(k) for k in keys}
+    data["messages"] = messages
+    s = json.dumps(data, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(s.encode("utf_8")).hexdigest()
+
+def get_path(key):
+    return os.path.join(directory, key[:2], key + ".json")
+
+def get(config, messages):
+    """Return the cached response text, or None."""
+    if not enabled:
+        return None
+    path = get_path(make_key(config, messages))
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = json.load(f)["text"]
+        # The modification time orders entries for LRU eviction.
+        os.utime(path)
+        return text
+    except (OSError, ValueError, KeyError):
+        return None
+
+def put(config, messages, text):
+    if not enabled:
+        return
+    path = get_path(make_key(config, messages))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = json.dumps({"model": config.get("model"), "text": text}, ensure_ascii=False)
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(data)
+    size = os.path.getsize(tmp_file)
+    os.replace(tmp_file, path)
+    global total_size
+    with lock:
+        if total_size is None:
+            total_size = sum(size for _, size, _ in scan())
+        else:
+            total_size += size
+        if total_size > max_size:
+            evict()
+
+def scan():
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith(".json"):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+def evict():
+    """Remove least recently used entries down to 90% of `max_size`."""
+    global total_size
+    entries = sorted(scan())
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total_size <= max_size * 0.9:
+            break
+        try:
+            os.remove(path)
+            total_size -= size
+        except OSError:
+            pass
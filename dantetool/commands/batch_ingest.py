@@ -0,0 +1,50 @@
+import sys, os
+import argparse
+from dantetool import common, batch
+
+def add_args(parser):
+    parser.add_argument("-o", dest="outdir", type=str, default=".",
+                        help="output directory (default: .)")
+    parser.add_argument("manifest", type=str,
+                        help="batch manifest XML file (e.g., batch.xml)")
+    parser.add_argument("results", type=str,
+                        help="batch result JSONL file")
+
+def main_func(args):
+    qs = common.read_queries(args.manifest)
+    results = batch.read_results(args.results)
+
+    # Group queries by output file, keeping the manifest order
+    files = {}
+    for i, q in enumerate(qs):
+        if not q.error:
+            text, error = results.get(i, (None, "(no result)"))
+            if text and text.strip():
+                q.result = text.rstrip()
+            else:
+                q.error = error or "(empty result)"
+        if not (parsed := common.parse_info(q.info or "")):
+            print(f"invalid info @ {q.info}", file=sys.stderr)
+            continue
+        cantica, canto_no = parsed[:2]
+        xml = os.path.join(args.outdir, cantica, f"{canto_no:02}.xml")
+        files.setdefault(xml, []).append(q)
+
+    for xml, qs1 in files.items():
+        if os.path.exists(xml):
+            print(f"{xml}: already exists, skipped", file=sys.stderr)
+            continue
+        os.makedirs(os.path.dirname(xml), exist_ok=True)
+        common.write_queries(xml, qs1, count=len(qs1))
+        error = sum(1 for q in qs1 if not q.result)
+        print(f"{xml}: error={error}/{len(qs1)}")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write batch results into query XML files")
+    add_args(parser)
+    args = parser.parse_args(argv)
+    return main_func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+import sys, os, json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dantetool import batch, gemini
+
+def add_args(parser):
+    parser.add_argument("-p", dest="parallel", type=int, default=1,
+                        help="specify number of concurrent queries (default: 1)")
+    parser.add_argument("--manifest", dest="manifest", type=str,
+                        help="batch manifest with the model specs (default: the requests file with .xml)")
+    gemini.add_args(parser)
+    parser.add_argument("requests", type=str,
+                        help="batch request JSONL file")
+    parser.add_argument("results", type=str,
+                        help="batch result JSONL file to write")
+
+def main_func(args):
+    gemini.apply(args)
+
+    # The requests name the model without the provider, the manifest has it.
+    manifest = args.manifest or os.path.splitext(args.requests)[0] + ".xml"
+    models = batch.read_models(manifest) if os.path.exists(manifest) else {}
+
+    def run(r):
+        body = r["body"]
+        config = gemini.generation_config.copy()
+        index = int(r["custom_id"].split(" ", 1)[0])
+        gemini.set_model(config, models.get(index, body["model"]))
+        if "temperature" in body:
+            config["temperature"] = body["temperature"]
+        if "max_tokens" in body:
+            config["max_length"] = body["max_tokens"]
+        messages = body["messages"]
+        q, _ = gemini.send(config, messages[:-1], messages[-1]["content"], r["custom_id"])
+        return batch.make_result(r["custom_id"], q.result, q.error)
+
+    requests = list(batch.read_jsonl(args.requests))
+    with ThreadPoolExecutor(max(1, args.parallel)) as pool, \
+            open(args.results, "w", encoding="utf-8") as f:
+        for i, r in enumerate(pool.map(run, requests), 1):
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+            print(f"\r{i}/{len(requests)}", end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process a batch request file locally")
+    add_args(parser)
+    args = parser.parse_args(argv)
+    return main_func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
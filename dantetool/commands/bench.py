@@ -0,0 +1,69 @@
+import sys, os, time, tempfile
+import argparse
+from xml.parsers import expat
+from dantetool import common
+
+def add_args(parser):
+    parser.add_argument("-c", dest="codecs", type=str, default=",".join(common.codecs),
+                        help=f"comma-separated codecs to compare (default: {','.join(common.codecs)})")
+    parser.add_argument("paths", nargs="+", type=str,
+                        help="XML files or directories (searched recursively)")
+
+def read(codec, f):
+    """Return the queries of a file as strings, or the exception of the codec."""
+    try:
+        return [str(q) for q in codec(f)]
+    except (expat.ExpatError, ValueError) as e:
+        return e
+
+def main_func(args):
+    names = args.codecs.split(",")
+    for name in names:
+        if name not in common.codecs:
+            print(f"Error: Unknown codec: {name}", file=sys.stderr)
+            return 1
+    files = [f for path in args.paths for f in common.find_files(path)]
+    size = sum(os.path.getsize(f) for f in files)
+    print(f"{len(files)} files, {size / 1e6:.1f} MB")
+
+    results = {}
+    for name in names:
+        codec = common.codecs[name]
+        start = time.perf_counter()
+        results[name] = [read(codec, f) for f in files]
+        t = time.perf_counter() - start
+        print(f"read {name:8} {t:7.2f} s {size / 1e6 / t:7.1f} MB/s")
+
+    # Every codec must read every file and give the same queries.
+    ret = 0
+    for name in names:
+        for f, r in zip(files, results[name]):
+            if isinstance(r, Exception):
+                print(f"Error: {name} failed: {f}: {r}", file=sys.stderr)
+                ret = 1
+    first = results[names[0]]
+    for name in names[1:]:
+        for f, a, b in zip(files, first, results[name]):
+            if a != b and not isinstance(a, Exception) and not isinstance(b, Exception):
+                print(f"Error: {name} differs from {names[0]}: {f}", file=sys.stderr)
+                ret = 1
+
+    # The queries of all files are held in memory to time only the writing.
+    qss = [list(common.iter_queries(f)) for f in files]
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "out.xml")
+        start = time.perf_counter()
+        for qs in qss:
+            common.write_queries(out, qs, count=len(qs))
+        t = time.perf_counter() - start
+    print(f"write {t:15.2f} s {size / 1e6 / t:7.1f} MB/s")
+    return ret
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the codecs of query files")
+    add_args(parser)
+    args = parser.parse_args(argv)
+    return main_func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
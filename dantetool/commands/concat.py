@@ -9,10 +9,10 @@ def add_args(parser):
                         help="input XML files to concatenate")
 
 def main_func(args):
-    qs = []
-    for input_file in args.inputs:
-        qs += common.read_queries(input_file)
-    common.write_queries(args.output, qs, count=len(qs))
+    # The count goes first, so the inputs are read twice to hold one query at a time.
+    count = sum(1 for f in args.inputs for _ in common.iter_queries(f))
+    qs = (q for f in args.inputs for q in common.iter_queries(f))
+    common.write_queries(args.output, qs, count=count)
     return 0
 
 def main(argv=None):
@@ -3,7 +3,7 @@
 import sys
 import os
 import argparse
-from dantetool import common
+from dantetool import common, index
 
 
 def replace_table_columns(prompt, source_table, source_columns):
@@ -68,6 +68,8 @@ def add_args(parser):
     parser.add_argument("-c", "--columns", required=True,
                         help="Source columns to copy (comma-separated, e.g., '0,1'). "
                              "These will fill destination columns starting from 0.")
+    parser.add_argument("--index", dest="index", metavar="DB",
+                        help="Look up source queries in an index database (see 'index'), updating it first")
     parser.add_argument("error_file", help="Error file to fix (e.g., 1-error.xml)")
     parser.add_argument("source_dir", help="Source directory (e.g., ../word/gemma3-it)")
 
@@ -81,19 +83,24 @@ def main_func(args):
     error_qs = common.read_queries(error_file)
 
     # Build source query lookup: info -> query
-    source_lookup = {}
-    for cantica in ["inferno", "purgatorio", "paradiso"]:
-        cantica_dir = os.path.join(source_dir, cantica)
-        if not os.path.isdir(cantica_dir):
-            continue
-        for filename in os.listdir(cantica_dir):
-            if not filename.endswith(".xml"):
+    if args.index:
+        con = index.connect(args.index)
+        index.update(con, [source_dir])
+        source_lookup = index.lookup(con, source_dir)
+    else:
+        source_lookup = {}
+        for cantica in ["inferno", "purgatorio", "paradiso"]:
+            cantica_dir = os.path.join(source_dir, cantica)
+            if not os.path.isdir(cantica_dir):
                 continue
-            filepath = os.path.join(cantica_dir, filename)
-            qs = common.read_queries(filepath)
-            for q in qs:
-                if q.info and q.result:
-                    source_lookup[q.info] = q
+            for filename in os.listdir(cantica_dir):
+                if not filename.endswith(".xml"):
+                    continue
+                filepath = os.path.join(cantica_dir, filename)
+                qs = common.read_queries(filepath)
+                for q in qs:
+                    if q.info and q.result:
+                        source_lookup[q.info] = q
 
     # Update prompts in error queries
     modified = False
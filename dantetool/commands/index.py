@@ -0,0 +1,62 @@
+import sys
+import argparse
+from dantetool import common, index
+
+def add_args(parser):
+    parser.add_argument("-d", dest="db", type=str, default=index.default,
+                        help=f"specify index database (default: {index.default})")
+    parser.add_argument("-l", dest="line", type=str,
+                        help="show the queries covering a line, e.g. inferno/5/73")
+    parser.add_argument("-s", dest="stage", type=str,
+                        help="only show queries of this stage (e.g. word-tr)")
+    parser.add_argument("-m", dest="model", type=str,
+                        help="only show queries of this model directory (e.g. gemma3-it)")
+    parser.add_argument("--status", dest="status", choices=["ok", "error", "skip"],
+                        help="only show queries with this status")
+    parser.add_argument("paths", nargs="*", type=str,
+                        help="directories (searched recursively) or canto XML files to index first")
+
+def parse_line(spec):
+    """Parse `cantica/canto/line` into `(cantica, canto, line)`."""
+    try:
+        cantica, canto, line = spec.lower().split("/")
+        if cantica in common.directories:
+            return cantica, int(canto), int(line)
+    except ValueError:
+        pass
+    return None
+
+def main_func(args):
+    con = index.connect(args.db)
+    if args.paths:
+        read, removed = index.update(con, args.paths)
+        count, = con.execute("SELECT COUNT(*) FROM queries").fetchone()
+        print(f"{args.db}: {read} files read, {removed} removed, {count} queries", file=sys.stderr)
+
+    if not args.line:
+        return 0
+    if not (place := parse_line(args.line)):
+        print(f"Error: Invalid line: {args.line}", file=sys.stderr)
+        return 1
+    sql = ("SELECT stage, model, language, status, info, result, error FROM queries"
+           " WHERE cantica = ? AND canto = ? AND line <= ? AND ? <= last")
+    params = [*place, place[2]]
+    for column in ["stage", "model", "status"]:
+        if value := getattr(args, column):
+            sql += f" AND {column} = ?"
+            params.append(value)
+    for stage, model, language, status, info, result, error in con.execute(sql + " ORDER BY stage, model", params):
+        print(f"## {stage}/{model} ({language}) {info} [{status}]")
+        print()
+        print(result or error or "")
+        print()
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index query files of all stages and models in SQLite")
+    add_args(parser)
+    args = parser.parse_args(argv)
+    return main_func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
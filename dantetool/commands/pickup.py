@@ -17,7 +17,7 @@ def main_func(args):
     whole = 0
     queries = []
     for f in args.files:
-        for q in common.read_queries(f):
+        for q in common.iter_queries(f):
             whole += 1
             if check_table:
                 if q.result:
@@ -0,0 +1,82 @@
+import sys
+import argparse
+import subprocess
+import threading
+from queue import Queue
+from dantetool import common, option
+
+def add_args(parser):
+    parser.add_argument("-d", dest="directories", type=str, default=",".join(common.directories),
+                        help="specify sub directory (comma-separated)")
+    parser.add_argument("-a", dest="rangemin", type=int, default=1,
+                        help="specify range min (default: 1)")
+    parser.add_argument("-r", dest="rangemax", type=int, default=35,
+                        help="specify range max (default: 35)")
+    parser.add_argument("-s", dest="srcdir", type=str, default="it",
+                        help="source directory whose <cantica>/NN.txt give the cantos (default: it)")
+    parser.add_argument("stages", nargs="+", type=str,
+                        help="stage directories in order (e.g. word/gemma3-it word-tr/gemma3-it etymology/gemma3-it), "
+                             "optionally with a make target other than canto (e.g. word-tr/gemma3-it:canto-etymology)")
+
+lock = threading.Lock()
+
+def run(stage, directory, canto):
+    """Run `make canto` for one canto in a stage directory, prefixing its output."""
+    prefix = f"[{stage} {directory} {canto:02}]"
+    path, _, target = stage.partition(":")
+    cmd = ["make", "-s", "-C", path, target or "canto", f"D={directory}", f"N={canto}"]
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                          text=True, encoding="utf-8", errors="replace") as p:
+        for line in p.stdout:
+            with lock:
+                print(prefix, line, end="", flush=True)
+    with lock:
+        print(prefix, "done" if p.returncode == 0 else f"failed ({p.returncode})", flush=True)
+    return p.returncode == 0
+
+def worker(stage, todo, done, failed):
+    """Process cantos from `todo` in order and pass successful ones on to `done`."""
+    while (item := todo.get()) is not None:
+        if run(stage, *item):
+            done.put(item)
+        else:
+            failed.append((stage, *item))
+    done.put(None)
+
+def main_func(args):
+    directories = args.directories.split(",")
+    for d in directories:
+        if d not in common.directories:
+            print(f"Error: Unknown cantica '{d}'. Must be one of: {', '.join(common.directories)}", file=sys.stderr)
+            return 1
+    cantos = option.list_cantos(args.srcdir, directories, args.rangemin, args.rangemax)
+    if not cantos:
+        print(f"Error: No cantos found in {args.srcdir}", file=sys.stderr)
+        return 1
+
+    # One queue in front of every stage; a canto moves on as soon as it passes.
+    queues = [Queue() for _ in range(len(args.stages) + 1)]
+    for d, canto, _ in cantos:
+        queues[0].put((d, canto))
+    queues[0].put(None)
+
+    failed = []
+    threads = [threading.Thread(target=worker, args=(stage, queues[i], queues[i + 1], failed))
+               for i, stage in enumerate(args.stages)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for stage, d, canto in failed:
+        print(f"Error: {stage} {d} {canto:02} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run stages canto by canto as a pipeline")
+    add_args(parser)
+    args = parser.parse_args(argv)
+    return main_func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,6 +17,7 @@ def add_args(parser):
                         help="split 3-line queries into separate 1-line queries")
     parser.add_argument("--no-think", dest="think", action="store_false", default=None,
                         help="don't include thoughts in response")
+    gemini.add_args(parser)
     parser.add_argument("input", type=str,
                         help="input XML file (e.g., 1-error.xml)")
 
@@ -36,6 +37,7 @@ def is_skip(q):
     return q.result or (q.error and q.error == "(skip)")
 
 def main_func(args):
+    gemini.apply(args)
     if args.temperature is not None:
         gemini.generation_config["temperature"] = args.temperature
 
@@ -79,15 +81,12 @@ def main_func(args):
         queries.append([q])
         q = next(it, None)
 
+    # Results are appended as they come, and the headers completed at the end.
     fn = os.path.splitext(args.input)[0]
-    def save_ok():
-        common.write_queries(f"{fn}-ok.xml", qs_ok, count=len(qs_ok))
-    def save_ng():
-        error = sum(1 for q in qs_ng if not q.result)
-        common.write_queries(f"{fn}-ng.xml", qs_ng, error=error, count=len(qs_ng))
+    qs_ok = common.appender(f"{fn}-ok.xml")
+    qs_ng = common.appender(f"{fn}-ng.xml")
 
-    qs_ok = []
-    qs_ng = []
+    chat = gemini.session(args.model, history, system=system_prompt, think=args.think)
     i = 0
     count = sum(1 for qs1 in queries for q in qs1 if not is_skip(q))
     for qs1 in queries:
@@ -101,9 +100,9 @@ def main_func(args):
                 if i > 1:
                     print()
                 print(f"==== {i}/{count} ====", file=sys.stderr)
-                if not (0 <= gemini.chat_count < args.interval):
-                    gemini.init(args.model, history, system=system_prompt, think=args.think)
-                qq = gemini.query(q.prompt, q.info, show=True, retry=False)
+                if chat.count >= args.interval:
+                    chat.reset()
+                qq = chat.query(q.prompt, q.info, show=True, retry=False)
             qs2.append(qq)
             if qq.result:
                 ok += 1
@@ -131,17 +130,18 @@ def main_func(args):
                     if q.result:
                         q.result += "\n"
                     q.result += line
-            qs_ok.append(q)
-            save_ok()
+            qs_ok.add(q)
         elif ok == len(qs2):
-            qs_ok += qs2
-            save_ok()
+            for q in qs2:
+                qs_ok.add(q)
         else:
-            qs_ng += qs2
-            save_ng()
+            for q in qs2:
+                qs_ng.add(q)
+    qs_ok.close(count=qs_ok.count)
+    qs_ng.close(error=qs_ng.errors, count=qs_ng.count)
 
     all = sum(map(len, queries))
-    print("OK:", len(qs_ok), ", NG:", len(qs_ng), ", ALL:", all, file=sys.stderr)
+    print("OK:", qs_ok.count, ", NG:", qs_ng.count, ", ALL:", all, file=sys.stderr)
 
     return 0
 
@@ -0,0 +1,134 @@
+"""
+Translate with several models and languages at once
+Usage: uv run dantetool run ../it gemma3-en gemma3-ja gptoss-en gptoss-ja (in translate/)
+Output: <target>/<cantica>/NN.xml, as translate.py would write it
+"""
+import sys, os, asyncio
+import argparse
+from dantetool import common, gemini, option
+from dantetool.batch import writer as batch_writer
+from dantetool.journal import writer as journal_writer
+
+def add_args(parser):
+    parser.add_argument("-d", dest="directories", type=str,
+                        help="specify sub directory (comma-separated)")
+    parser.add_argument("-a", dest="rangemin", type=int, default=1,
+                        help="specify range min (default: 1)")
+    parser.add_argument("-r", dest="rangemax", type=int, default=35,
+                        help="specify range max (default: 35)")
+    parser.add_argument("-n", dest="interval", type=int, default=10,
+                        help="specify chat reset interval, 0 for none (default: 10)")
+    parser.add_argument("-p", dest="parallel", type=int, default=1,
+                        help="specify number of concurrent queries per model (default: 1)")
+    parser.add_argument("-s", dest="system_prompt", type=str,
+                        help="specify system prompt file (default: system.txt next to the targets)")
+    parser.add_argument("--no-show", dest="show", action="store_false", default=True,
+                        help="don't show queries and responses")
+    parser.add_argument("--no-retry", dest="retry", action="store_false", default=True,
+                        help="don't retry queries")
+    parser.add_argument("--need-space", dest="needsp", action="store_true",
+                        help="require at least one space in each line")
+    parser.add_argument("-3", dest="always3", action="store_true",
+                        help="always send 3 lines")
+    parser.add_argument("--pack", dest="pack", type=int, default=0,
+                        help="pack whole sentences into requests of about this many source tokens (default: off)")
+    parser.add_argument("--batch", dest="batch", type=str,
+                        help="write pending requests to a JSONL batch file of this name in each target instead of querying")
+    gemini.add_args(parser)
+    parser.add_argument("srcdir", type=str,
+                        help="source directory")
+    parser.add_argument("targets", nargs="+", type=str,
+                        help="target directories with Makefile (MODEL, LANG) and init.xml")
+
+class target:
+    """One model and language, configured like `make run` in its directory."""
+
+    def __init__(self, path, system, args):
+        defs = common.read_defs(os.path.join(path, "Makefile"))
+        # e.g. MODEL = google:gemma-3-27b-it --no-think
+        self.model, *flags = defs["MODEL"].split()
+        think = False if "--no-think" in flags else None
+        self.path = path
+        self.language = defs["LANG"]
+        self.prompt = common.translation_prompt(self.language)
+        self.checklen = common.translation_checklen(self.language)
+        self.needsp = args.needsp
+        self.pack = args.pack
+        self.batch = batch_writer(os.path.join(path, args.batch)) if args.batch else None
+        init_qs = common.read_queries(os.path.join(path, "init.xml"))
+        self.executor = gemini.executor(self.model, common.unzip(init_qs), system=system, think=think,
+                                        interval=args.interval, workers=args.parallel)
+
+    def build(self, text, start, count, info):
+        return common.translation_job(self.prompt, text, start, count, info, self.checklen, self.needsp)
+
+    async def run(self, cantos, load, show, retry):
+        for d, canto, src in cantos:
+            xml = os.path.join(self.path, d, f"{canto:02}.xml")
+            if os.path.exists(xml):
+                continue
+            os.makedirs(os.path.dirname(xml), exist_ok=True)
+            info = f"{d[0].upper() + d[1:]} Canto {canto}"
+            print(f"# {self.path}: {info}")
+            text, groups = load(src)
+            jobs = [self.build(text, start, count, info) for start, count in groups]
+            if self.batch:
+                self.executor.render(self.batch, jobs)
+                continue
+            journal = journal_writer(xml)
+            if self.pack > 0:
+                job = lambda start, count: self.build(text, start, count, info)
+                packs, split = common.translation_packs(text, groups, jobs, self.pack, job)
+                qs = await self.executor.apacked(jobs, packs, split, show, retry, journal)
+            else:
+                qs = await self.executor.amap(jobs, show, retry, journal)
+            common.write_queries(xml, qs, count=len(qs))
+            journal.close()
+
+def main_func(args):
+    gemini.apply(args)
+
+    system_file = args.system_prompt
+    if not system_file:
+        system_file = os.path.join(os.path.dirname(os.path.abspath(args.targets[0])), "system.txt")
+    with open(system_file, "r", encoding="utf-8") as f:
+        system = f.read().strip()
+
+    targets = [target(path, system, args) for path in args.targets]
+    # Targets on the same model share its concurrency limit.
+    semaphores = {}
+    for t in targets:
+        t.executor.semaphore = semaphores.setdefault(t.model, t.executor.semaphore)
+
+    dirs = args.directories.split(",") if args.directories else common.directories
+    cantos = option.list_cantos(args.srcdir, dirs, args.rangemin, args.rangemax)
+
+    # Every source file is read and grouped once for all targets.
+    sources = {}
+    def load(src):
+        if src not in sources:
+            text = common.read_lines(src)
+            sources[src] = text, common.split_lines(text, args.always3)
+        return sources[src]
+
+    async def run():
+        return await asyncio.gather(*(t.run(cantos, load, args.show, args.retry) for t in targets),
+                                    return_exceptions=True)
+
+    ret = 0
+    for t, e in zip(targets, asyncio.run(run())):
+        if isinstance(e, BaseException):
+            print(f"Error: {t.path}: {e}", file=sys.stderr)
+            ret = 1
+        if t.batch:
+            t.batch.close()
+    return ret
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Translate with several models and languages at once")
+    add_args(parser)
+    args = parser.parse_args(argv)
+    return main_func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
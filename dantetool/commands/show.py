@@ -6,9 +6,7 @@ def add_args(parser):
     parser.add_argument("file", help="XML file to read")
 
 def main_func(args):
-    qs = common.read_queries(args.file)
-
-    for q in qs:
+    for q in common.iter_queries(args.file):
         if not q.result:
             continue
         for line in q.result.splitlines():
@@ -0,0 +1,101 @@
+import sys
+import argparse
+from pathlib import Path
+from dantetool import common
+
+levels = ["model", "stage", "canto"]
+default_by = "model,stage"
+
+def add_args(parser):
+    parser.add_argument("--by", dest="by", type=str, default=default_by,
+                        help=f"comma-separated grouping out of {', '.join(levels)} (default: {default_by})")
+    parser.add_argument("paths", nargs="+", type=str,
+                        help="XML files or directories (searched recursively)")
+
+def locate(file):
+    """Return `(stage, model, canto)` for a path like word/gemma3-it/inferno/01.xml."""
+    p = Path(file).resolve()
+    # Missing levels (near the root) are unknown.
+    names = [d.name or "?" for d in p.parents][:3] + ["?"] * 3
+    if p.parent.name in common.directories:
+        return names[2], names[1], f"{p.parent.name}/{p.stem}"
+    return names[1], names[0], p.stem
+
+class total:
+    def __init__(self):
+        self.queries = 0
+        self.ids = set()  # model IDs recorded in the queries
+        self.errors = 0
+        self.measured = 0
+        self.retries = 0
+        self.hedged = 0
+        self.time = 0.0
+        self.ttft = []
+        self.tokens = {"input": 0, "output": 0, "thoughts": 0}
+        self.output_time = 0.0
+
+    def add(self, q):
+        self.queries += 1
+        if "model" in q.metrics:
+            self.ids.add(q.metrics["model"])
+        if not q.result:
+            self.errors += 1
+        m = q.metrics
+        if "time" not in m:
+            return
+        self.measured += 1
+        self.retries += m.get("tries", 1) - 1
+        self.hedged += m.get("hedged", 0)
+        self.time += m["time"]
+        if "ttft" in m:
+            self.ttft.append(m["ttft"])
+        for k in self.tokens:
+            self.tokens[k] += m.get(k, 0)
+        if "output" in m:
+            self.output_time += m["time"]
+
+    def row(self):
+        mean = f"{self.time / self.measured:.2f}" if self.measured else ""
+        ttft = f"{sum(self.ttft) / len(self.ttft):.2f}" if self.ttft else ""
+        rate = f"{self.tokens['output'] / self.output_time:.1f}" if self.output_time else ""
+        return [", ".join(sorted(self.ids)), str(self.queries), str(self.errors), str(self.measured), str(self.retries), str(self.hedged),
+                f"{self.time:.1f}", mean, ttft,
+                *(str(v) for v in self.tokens.values()), rate]
+
+header = ["model id", "queries", "errors", "measured", "retries", "hedged", "time", "mean", "ttft",
+          "input", "output", "thoughts", "output/s"]
+
+def main_func(args):
+    by = [b.strip() for b in args.by.split(",") if b.strip()]
+    if not by or any(b not in levels for b in by):
+        print(f"Error: --by must be a comma-separated list of {', '.join(levels)}", file=sys.stderr)
+        return 1
+
+    totals = {}
+    for path in args.paths:
+        for f in common.find_files(path):
+            stage, model_dir, canto = locate(f)
+            for q in common.iter_queries(f):
+                # The directory, since only queries sent with metrics have the model ID.
+                keys = {"model": model_dir, "stage": stage, "canto": canto}
+                group = tuple(keys[b] for b in by)
+                totals.setdefault(group, total()).add(q)
+
+    if not totals:
+        print("Error: no queries found", file=sys.stderr)
+        return 1
+
+    print("| " + " | ".join(by + header) + " |")
+    print("|" + "|".join(["---"] * (len(by) + len(header))) + "|")
+    for group in sorted(totals):
+        print("| " + " | ".join(list(group) + totals[group].row()) + " |")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report query metrics per model, stage and canto")
+    add_args(parser)
+    args = parser.parse_args(argv)
+    return main_func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
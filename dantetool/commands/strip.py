@@ -2,7 +2,7 @@ import sys
 import re
 import argparse
 from pathlib import Path
-from dantetool import common
+from dantetool import common, index
 
 def add_args(parser):
     parser.add_argument("targets", nargs="+", type=str,
@@ -17,12 +17,16 @@ def add_args(parser):
     validation_group.add_argument("--validate-source", type=str,
                         help="validate against source directory (e.g., '../word-tr/gemma3-it')")
 
+    parser.add_argument("--index", type=str, metavar="DB",
+                        help="with --validate-source, look up source queries in an index database (see 'index'), updating it first")
     parser.add_argument("--validate-column", type=str, default=None,
                         help="column index to validate (0=Word, 1=Lemma, etc.). Comma-separated for multiple columns (e.g., '0,1'). Only valid with --validate-source")
     parser.add_argument("--italian-lemma", type=int, default=None,
                         help="validate Italian lemma column (must have alpha and no apostrophe)")
     parser.add_argument("--replace-prompt", action="store_true",
                         help="replace prompt numbered lines with canonical canto text from tokenize/")
+    parser.add_argument("--fail-on-error", action="store_true",
+                        help="exit with status 1 if any query has no result afterwards, except skipped ones")
 
 def parse_column_indices(column_spec):
     """Parse column specification string into list of integers.
@@ -95,12 +99,13 @@ def load_tokenized_canto(target_path):
     except FileNotFoundError:
         return None
 
-def load_source_queries(target_path, source_dir):
+def load_source_queries(target_path, source_dir, con=None):
     """Load source queries from a source directory (e.g., word-tr).
 
     Args:
         target_path: Path to the target XML file
         source_dir: Source directory containing reference data
+        con: Index database to look up instead of reading the source file
 
     Returns:
         dict[str, Query] | None: Mapping from query.info to Query object
@@ -114,6 +119,8 @@ def load_source_queries(target_path, source_dir):
 
     if not source_file.exists():
         return None
+    if con:
+        return index.lookup(con, source_dir, cantica, canto_no)
 
     # Read source queries and build info -> query mapping
     qs = common.read_queries(str(source_file))
@@ -182,6 +189,71 @@ def replace_prompt_in_query(q, canto):
 
     return False
 
+def reference_tokens(q, canto=None, source_queries=None, column_indices=None):
+    """Return the reference tokens of a query for each column, or None.
+
+    Args:
+        q: Query object (info and prompt are used)
+        canto: Tokenized canto data (for --validate-tokens)
+        source_queries: Dict mapping info -> source Query (for --validate-source)
+        column_indices: List of column indices to validate (e.g., [0, 1])
+    """
+    if column_indices is None:
+        column_indices = [0]
+    ref_tokens_per_column = []
+
+    if source_queries is not None:
+        # Extract from source query for each column
+        source_q = source_queries.get(q.info)
+        if not source_q:
+            return None
+
+        source_table = common.read_table(source_q.result)
+        if not source_table or len(source_table) < 3:
+            return None
+
+        # Extract tokens for each column index
+        for column_index in column_indices:
+            col_tokens = []
+            for row in source_table[2:]:  # Skip header and separator
+                if len(row) <= column_index:
+                    continue
+                token = fix_token(row[column_index])
+                if common.has_alpha(token):
+                    col_tokens.append(token)
+            ref_tokens_per_column.append(col_tokens)
+
+    elif canto is not None:
+        # Extract from tokenize data (single column only - always column 0)
+        # First, get numbered lines from prompt
+        numbered_lines = common.extract_numbered_lines(q.prompt)
+        if not numbered_lines:
+            # Fallback: extract from query.info
+            parsed = common.parse_info(q.info or "")
+            if parsed:
+                _, _, line_no, total_lines = parsed
+                line_numbers = list(range(line_no, min(line_no + 2, total_lines) + 1))
+                numbered_lines = []
+                for ln in line_numbers:
+                    if 1 <= ln <= len(canto):
+                        canto_text = canto[ln - 1][0]
+                        numbered_lines.append((ln, canto_text, f"{ln} {canto_text}"))
+
+        col_tokens = []
+        if numbered_lines:
+            for line_no, _, _ in numbered_lines:
+                if not (1 <= line_no <= len(canto)):
+                    continue
+                parts = canto[line_no - 1]
+                if not parts:
+                    continue
+                # tokenize format: [original_line, token1, token2, ...]
+                col_tokens.extend(parts[1:])
+        if col_tokens:
+            ref_tokens_per_column.append(col_tokens)
+
+    return ref_tokens_per_column or None
+
 def load_reference_data(target, canto=None, source_queries=None, column_indices=None):
     """Load reference data and convert to common format.
 
@@ -194,8 +266,6 @@ def load_reference_data(target, canto=None, source_queries=None, column_indices=
     Returns:
         dict[str, list[list[str]]]: Mapping from query.info to list of reference tokens for each column
     """
-    if column_indices is None:
-        column_indices = [0]
     # Read target queries to get all query.info
     qs = common.read_queries(target)
     reference_data = {}
@@ -203,60 +273,7 @@ def load_reference_data(target, canto=None, source_queries=None, column_indices=
     for q in qs:
         if not q.result:
             continue
-
-        ref_tokens_per_column = []
-
-        if source_queries is not None:
-            # Extract from source query for each column
-            source_q = source_queries.get(q.info)
-            if not source_q:
-                continue
-
-            source_table = common.read_table(source_q.result)
-            if not source_table or len(source_table) < 3:
-                continue
-
-            # Extract tokens for each column index
-            for column_index in column_indices:
-                col_tokens = []
-                for row in source_table[2:]:  # Skip header and separator
-                    if len(row) <= column_index:
-                        continue
-                    token = fix_token(row[column_index])
-                    if common.has_alpha(token):
-                        col_tokens.append(token)
-                ref_tokens_per_column.append(col_tokens)
-
-        elif canto is not None:
-            # Extract from tokenize data (single column only - always column 0)
-            # First, get numbered lines from prompt
-            numbered_lines = common.extract_numbered_lines(q.prompt)
-            if not numbered_lines:
-                # Fallback: extract from query.info
-                parsed = common.parse_info(q.info or "")
-                if parsed:
-                    _, _, line_no, total_lines = parsed
-                    line_numbers = list(range(line_no, min(line_no + 2, total_lines) + 1))
-                    numbered_lines = []
-                    for ln in line_numbers:
-                        if 1 <= ln <= len(canto):
-                            canto_text = canto[ln - 1][0]
-                            numbered_lines.append((ln, canto_text, f"{ln} {canto_text}"))
-
-            col_tokens = []
-            if numbered_lines:
-                for line_no, _, _ in numbered_lines:
-                    if not (1 <= line_no <= len(canto)):
-                        continue
-                    parts = canto[line_no - 1]
-                    if not parts:
-                        continue
-                    # tokenize format: [original_line, token1, token2, ...]
-                    col_tokens.extend(parts[1:])
-            if col_tokens:
-                ref_tokens_per_column.append(col_tokens)
-
-        if ref_tokens_per_column:
+        if ref_tokens_per_column := reference_tokens(q, canto, source_queries, column_indices):
             reference_data[q.info] = ref_tokens_per_column
 
     return reference_data
@@ -314,6 +331,60 @@ def validate_table_with_reference(table, ref_tokens_per_column):
 
     return None
 
+def clean_table(result):
+    """Parse and normalize a word table for validation.
+
+    Returns:
+        list[list[str]] | None: Table without non-alpha rows, or None if it cannot be parsed
+    """
+    parsed_table = common.read_table(result)
+    if not parsed_table:
+        return None
+
+    # Fix table format
+    fixed_table = common.fix_table_rows(table=parsed_table)
+
+    # Filter: remove non-alpha rows, apply fix_token
+    table = []
+    for i, row in enumerate(fixed_table):
+        if i < 2:
+            # Keep header and separator rows as is
+            table.append(row)
+        else:
+            row[0] = fix_token(row[0])
+            if common.has_alpha(row[0]):
+                table.append(row)
+    return table
+
+def validate_table(info, table, reference_data=None, italian_lemma_col=None):
+    """Validate a cleaned table against reference data and the lemma column.
+
+    Returns:
+        None if OK, otherwise a list of errors.
+    """
+    # Validate against reference data
+    errors = None
+    if reference_data is not None:
+        ref_tokens = reference_data.get(info)
+
+        if ref_tokens is None:
+            # No reference data for this query
+            errors = [("no_reference", f"No reference data for {info}")]
+        else:
+            # Validate
+            errors = validate_table_with_reference(table, ref_tokens)
+
+    # Validate Italian lemma column
+    if italian_lemma_col is not None:
+        lemma_errors = validate_italian_lemma(table, italian_lemma_col)
+        if lemma_errors:
+            if errors is None:
+                errors = lemma_errors
+            else:
+                errors.extend(lemma_errors)
+
+    return errors
+
 def process_file_with_validation(target, reference_data, canto=None, replace_prompt=False, italian_lemma_col=None):
     """Process a single XML file: normalize tables and validate against reference.
 
@@ -378,25 +449,11 @@ def process_file_with_validation(target, reference_data, canto=None, replace_pro
                     modified = True
 
         # Parse table
-        parsed_table = common.read_table(q.result)
-        if not parsed_table:
+        table = clean_table(q.result)
+        if not table:
             error(q, "could not parse table in")
             continue
 
-        # Fix table format
-        fixed_table = common.fix_table_rows(table=parsed_table)
-
-        # Filter: remove non-alpha rows, apply fix_token
-        table = []
-        for i, row in enumerate(fixed_table):
-            if i < 2:
-                # Keep header and separator rows as is
-                table.append(row)
-            else:
-                row[0] = fix_token(row[0])
-                if common.has_alpha(row[0]):
-                    table.append(row)
-
         # Update result
         orig_result = q.result
         orig_error = q.error
@@ -405,26 +462,7 @@ def process_file_with_validation(target, reference_data, canto=None, replace_pro
         if q.result != orig_result or q.error != orig_error:
             modified = True
 
-        # Validate against reference data
-        errors = None
-        if reference_data is not None:
-            ref_tokens = reference_data.get(q.info)
-
-            if ref_tokens is None:
-                # No reference data for this query
-                errors = [("no_reference", f"No reference data for {q.info}")]
-            else:
-                # Validate
-                errors = validate_table_with_reference(table, ref_tokens)
-
-        # Validate Italian lemma column
-        if italian_lemma_col is not None:
-            lemma_errors = validate_italian_lemma(table, italian_lemma_col)
-            if lemma_errors:
-                if errors is None:
-                    errors = lemma_errors
-                else:
-                    errors.extend(lemma_errors)
+        errors = validate_table(q.info, table, reference_data, italian_lemma_col)
 
         if errors is not None:
             error(q)
@@ -457,6 +495,11 @@ def main_func(args):
             print(f"Error: {e}", file=sys.stderr)
             return 1
 
+    con = None
+    if args.index and args.validate_source:
+        con = index.connect(args.index)
+        index.update(con, [args.validate_source])
+
     for target in args.targets:
         # Determine operation mode
         validate_mode = args.validate_tokens or args.validate_source is not None
@@ -468,7 +511,7 @@ def main_func(args):
 
             if args.validate_source:
                 # Load source queries for validation
-                source_queries = load_source_queries(target, args.validate_source)
+                source_queries = load_source_queries(target, args.validate_source, con)
                 if source_queries is None:
                     print(f"Error: --validate-source specified but no source data for {target}",
                           file=sys.stderr)
@@ -556,6 +599,14 @@ def main_func(args):
     if error_count:
         print(f"Total word position errors: {error_count}", file=sys.stderr)
 
+    if args.fail_on_error:
+        # Intentionally skipped queries are no errors.
+        errors = sum(1 for target in args.targets for q in common.iter_queries(target)
+                     if not q.result and q.error != "(skip)")
+        if errors:
+            print(f"Error: {errors} queries without result", file=sys.stderr)
+            return 1
+
     return 0
 
 def main(argv=None):
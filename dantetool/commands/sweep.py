@@ -0,0 +1,158 @@
+import sys
+import argparse
+from dantetool import common, cache, gemini
+from dantetool.commands import strip
+
+temperatures = "0.1,0.2,0.3,0.4,0.5,0.6,0.7,0.8,0.9,1.0"
+
+def add_args(parser):
+    parser.add_argument("-i", dest="init_xml", type=str, default="init.xml",
+                        help="specify init.xml file (default: init.xml)")
+    parser.add_argument("-m", dest="model", type=str, required=True,
+                        help="specify model name (required)")
+    parser.add_argument("-n", dest="interval", type=int, default=5,
+                        help=f"specify interval (default: 5)")
+    parser.add_argument("-s", dest="system_prompt", type=str,
+                        help="specify system prompt file")
+    parser.add_argument("-t", dest="temperatures", type=str, default=temperatures,
+                        help=f"comma-separated temperatures to try in order (default: {temperatures})")
+    parser.add_argument("--no-think", dest="think", action="store_false", default=None,
+                        help="don't include thoughts in response")
+
+    validation_group = parser.add_mutually_exclusive_group()
+    validation_group.add_argument("--validate-tokens", action="store_true",
+                        help="validate Word column against tokenize/ reference data")
+    validation_group.add_argument("--validate-source", type=str,
+                        help="validate against source directory (e.g., '../word-tr/gemma3-it')")
+    parser.add_argument("--validate-column", type=str, default=None,
+                        help="column index to validate (0=Word, 1=Lemma, etc.). Comma-separated for multiple columns (e.g., '0,1'). Only valid with --validate-source")
+    parser.add_argument("--italian-lemma", type=int, default=None,
+                        help="validate Italian lemma column (must have alpha and no apostrophe)")
+
+    gemini.add_args(parser)
+    parser.add_argument("input", type=str,
+                        help="input XML file (e.g., 1-error.xml)")
+    parser.add_argument("targets", nargs="+", type=str,
+                        help="target XML files to update")
+
+def load_references(args, target, qs, column_indices):
+    """Map info to reference tokens for the queries `qs` of one target file."""
+    if args.validate_source:
+        source_queries = strip.load_source_queries(target, args.validate_source) or {}
+        canto = None
+    elif args.validate_tokens:
+        source_queries = None
+        canto = strip.load_tokenized_canto(target)
+        if canto is None:
+            return {}
+    else:
+        return None
+    ret = {}
+    for q in qs:
+        if ref := strip.reference_tokens(q, canto, source_queries, column_indices):
+            ret[q.info] = ref
+    return ret
+
+def main_func(args):
+    if args.validate_tokens and args.validate_column is not None:
+        print("Error: --validate-column cannot be used with --validate-tokens", file=sys.stderr)
+        return 1
+    if args.validate_source is not None and args.validate_column is None:
+        print("Error: --validate-column is required with --validate-source", file=sys.stderr)
+        return 1
+    column_indices = None
+    if args.validate_column is not None:
+        try:
+            column_indices = strip.parse_column_indices(args.validate_column)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+    try:
+        temps = [float(t) for t in args.temperatures.split(",")]
+    except ValueError:
+        print(f"Error: Invalid temperatures: {args.temperatures}", file=sys.stderr)
+        return 1
+
+    gemini.apply(args)
+    # A cached answer is the same at every temperature, also when it fails
+    # validation, so every query goes to the model.
+    cache.enabled = False
+
+    if args.system_prompt:
+        with open(args.system_prompt, "r", encoding="utf-8") as f:
+            system_prompt = f.read().strip()
+    else:
+        system_prompt = None
+    history = common.unzip(common.read_queries(args.init_xml))
+
+    # Everything stays in memory until the end.
+    errors = common.read_queries(args.input)
+    pending = {q.info: q for q in errors if q.error != "(skip)"}
+    files = {}      # target -> queries
+    places = {}     # info -> (target, index)
+    references = {} # info -> reference tokens (None if not validated)
+    for target in args.targets:
+        qs = common.read_queries(target)
+        files[target] = qs
+        found = [q for q in qs if q.info in pending]
+        for i, q in enumerate(qs):
+            if q.info in pending and q.info not in places:
+                places[q.info] = (target, i)
+        refs = load_references(args, target, found, column_indices)
+        for q in found:
+            references[q.info] = refs
+    for info in list(pending):
+        if info not in places:
+            print("not found:", info, file=sys.stderr)
+            del pending[info]
+
+    def validate(q):
+        """Clean up the result like `strip` does; return the errors or None."""
+        table = strip.clean_table(q.result)
+        if not table:
+            return [("parse", "could not parse table")]
+        q.result = common.table_to_string(table)
+        return strip.validate_table(q.info, table, references[q.info], args.italian_lemma)
+
+    modified = set()
+    try:
+        for t in temps:
+            if not pending:
+                break
+            print(f"# temperature {t}: {len(pending)} queries", file=sys.stderr)
+            chat = gemini.session(args.model, history, system=system_prompt, think=args.think)
+            chat.config["temperature"] = t
+            for info in list(pending):
+                if chat.count >= args.interval:
+                    chat.reset()
+                q = chat.query(pending[info].prompt, info, show=False, retry=False)
+                if not q.result:
+                    continue
+                if e := validate(q):
+                    print(f"{info}: {e}", file=sys.stderr)
+                    continue
+                target, i = places[info]
+                files[target][i] = q
+                modified.add(target)
+                del pending[info]
+                print(f"{info}: fixed at temperature {t}", file=sys.stderr)
+    finally:
+        # Write each affected file once, also when stopped by errors.
+        for target in args.targets:
+            if target in modified:
+                qs = files[target]
+                common.write_queries(target, qs, count=len(qs))
+        remaining = [q for q in errors if q.info in pending or q.error == "(skip)"]
+        whole = sum(len(qs) for qs in files.values())
+        common.write_queries(args.input, remaining, count=len(remaining), whole=whole)
+        print(f"error {len(remaining)}/{whole}", file=sys.stderr)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retry error queries at rising temperatures")
+    add_args(parser)
+    args = parser.parse_args(argv)
+    return main_func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,31 @@
-import sys, os, re, xml7shi
+import sys, os, re, glob, itertools, shutil, xml7shi
+from xml.parsers import expat
+from . import sidecar
+
+# Canticas, in order
+directories = ["inferno", "purgatorio", "paradiso"]
 
 def escape(s):
     return s.replace("<", "&lt;").replace(">", "&gt;").replace("&", "&amp;")
 
+# Request metrics stored as attributes of <query>:
+# wall time and time to first token in seconds, token counts, attempts
+# and hedged duplicates
+metrics = {"model": str, "time": float, "ttft": float,
+           "input": int, "output": int, "thoughts": int, "tries": int, "hedged": int}
+
 class query:
     def __init__(self):
-        self.prompt = None
-        self.info   = None
-        self.result = None
-        self.error  = None
-        self.retry  = False
+        self.prompt  = None
+        self.info    = None
+        self.result  = None
+        self.error   = None
+        self.retry   = False
+        self.metrics = {}
 
     def __str__(self):
-        s = "<query>\n"
+        attrs = "".join(f' {k}="{self.metrics[k]}"' for k in metrics if k in self.metrics)
+        s = f"<query{attrs}>\n"
         if self.info:
             s += f"<info>{escape(self.info)}</info>\n"
         attrs = ' retry="true"' if self.retry else ''
@@ -26,6 +39,12 @@ class query:
 
 def parse(xr: xml7shi.reader):
     q = query()
+    for k, t in metrics.items():
+        if k in xr:
+            try:
+                q.metrics[k] = t(xr[k])
+            except ValueError:
+                pass
     while xr.read():
         if xr.tag == "prompt":
             q.retry = xr.get("retry") == "true"
@@ -41,16 +60,123 @@ def parse(xr: xml7shi.reader):
             break
     return q
 
-def read_queries(file):
+def xml7shi_queries(file, size=1 << 16):
+    """Yield the queries of any file, even a cut off one, reading it in pieces of `size`."""
+    tag = "</query>"
     with open(file, "r", encoding="utf-8") as f:
-        xml = f.read()
-    xr = xml7shi.reader(xml)
+        buf = ""
+        start = 0
+        eof = False
+        while not eof:
+            if (end := buf.find(tag, start)) >= 0:
+                end += len(tag)
+            elif data := f.read(size):
+                start = max(0, len(buf) - len(tag))
+                buf += data
+                continue
+            else:
+                # The rest, e.g. a query cut off at the end of the file
+                end = len(buf)
+                eof = True
+            xr = xml7shi.reader(buf[:end])
+            while xr.read():
+                if xr.tag == "query":
+                    yield parse(xr)
+            buf = buf[end:]
+            start = 0
+
+def expat_queries(file, size=1 << 16):
+    """Yield the queries of a well-formed file like `xml7shi_queries`,
+    parsed by expat.  Raises `ExpatError` on anything else."""
     qs = []
-    while xr.read():
-        if xr.tag == "query":
-            qs.append(parse(xr))
+    q = None
+    field = None
+    text = []
+    def start(tag, attrs):
+        nonlocal q, field
+        if tag == "query":
+            q = query()
+            for k, t in metrics.items():
+                if k in attrs:
+                    try:
+                        q.metrics[k] = t(attrs[k])
+                    except ValueError:
+                        pass
+        elif q is not None and tag in ("prompt", "info", "error", "result"):
+            if tag == "prompt":
+                q.retry = attrs.get("retry") == "true"
+            field = tag
+            text.clear()
+    def end(tag):
+        nonlocal q, field
+        if tag == field:
+            setattr(q, field, "".join(text).strip())
+            field = None
+        elif tag == "query" and q is not None:
+            qs.append(q)
+            q = None
+    def chars(s):
+        if field:
+            text.append(s)
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = chars
+    with open(file, "rb") as f:
+        while data := f.read(size):
+            parser.Parse(data, False)
+            yield from qs
+            qs.clear()
+        parser.Parse(b"", True)
+    yield from qs
+
+# Parsers of query files; xml7shi reads anything, expat (C) is faster
+codecs = {"expat": expat_queries, "xml7shi": xml7shi_queries}
+codec = "expat"
+
+def parse_queries(file, size=1 << 16):
+    """Yield the queries of a file one by one, reading it in pieces of `size`."""
+    count = 0
+    try:
+        for q in codecs[codec](file, size):
+            yield q
+            count += 1
+        return
+    except expat.ExpatError:
+        pass
+    # Not well-formed, e.g. cut off: read the rest with xml7shi.
+    yield from itertools.islice(xml7shi_queries(file, size), count, None)
+
+def to_row(q):
+    return q.info, q.prompt, q.result, q.error, q.retry, dict(q.metrics)
+
+def from_row(row):
+    q = query()
+    q.info, q.prompt, q.result, q.error, q.retry, q.metrics = row
+    return q
+
+def iter_queries(file, size=1 << 16):
+    """Yield the queries of a file one at a time.  The sidecar is not used,
+    since it holds the whole file (see `read_queries`)."""
+    yield from parse_queries(file, size)
+
+def read_queries(file):
+    """Return all queries of a file, storing them in its sidecar (see `sidecar`)."""
+    st = sidecar.stamp(file)
+    if st and (rows := sidecar.load(file, st)) is not None:
+        return [from_row(row) for row in rows]
+    qs = list(parse_queries(file))
+    if st:
+        sidecar.save(file, st, [to_row(q) for q in qs])
     return qs
 
+def find_files(path):
+    """Return the XML files under a directory (recursively), or the file itself."""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "**", "*.xml"), recursive=True))
+    return [path]
+
 def write(f, text="", end="\n"):
     f.write((str(text) + end).encode("utf_8"))
 
@@ -65,6 +191,48 @@ def write_queries(file, qs, **root_attrs):
         write(f, "</queries>")
     os.replace(tmp_file, file)
 
+class appender:
+    """Write a query file one query at a time, for results saved as they come.
+
+    Each query is appended and flushed, so a file left by a crash holds
+    every query added so far and is read like a cut off file.  `close`
+    puts the root attributes into the header and the closing tag at the
+    end, giving the same file as `write_queries`.  Nothing is written
+    until the first query is added."""
+
+    def __init__(self, file):
+        self.file = file
+        self.f = None
+        self.count = 0
+        self.errors = 0  # queries without a result
+
+    def add(self, q):
+        if not self.f:
+            self.f = open(self.file, "wb")
+            write(self.f, xml7shi.declaration)
+            write(self.f, "<queries>")
+            self.start = self.f.tell()
+        write(self.f, q, end="")
+        self.f.flush()
+        self.count += 1
+        if not q.result:
+            self.errors += 1
+
+    def close(self, **root_attrs):
+        if not self.f:
+            return
+        self.f.close()
+        self.f = None
+        tmp_file = self.file + ".tmp"
+        with open(self.file, "rb") as src, open(tmp_file, "wb") as f:
+            write(f, xml7shi.declaration)
+            attrs = "".join(f' {k}="{v}"' for k, v in root_attrs.items())
+            write(f, f"<queries{attrs}>")
+            src.seek(self.start)
+            shutil.copyfileobj(src, f)
+            write(f, "</queries>")
+        os.replace(tmp_file, self.file)
+
 def unzip(qs):
     ret = []
     for q in qs:
@@ -254,12 +422,133 @@ def extract_numbered_lines(prompt: str) -> list[tuple[int, str, str]]:
             ret.append((int(m.group(1)), m.group(2), raw))
     return ret
 
+# translate
+
+def read_lines(src):
+    """Read the lines of a source canto, without the text after `|`."""
+    with open(src, "r", encoding="utf-8") as f:
+        return [l.split("|")[0] for line in f if (l := line.strip())]
+
+def translation_prompt(language):
+    return f"Please translate each line literally into {language}."
+
+def translation_checklen(language):
+    """Maximum ratio of reply to prompt length; two languages take twice as much."""
+    return 6 if " and " in language else 3
+
+def translation_job(prompt, text, start, count, info, checklen=3, needsp=False):
+    """Return the job `(prompt, info, check)` for `count` lines of a canto
+    from `start`; `info` is like `Inferno Canto 1`."""
+    prompt += number_lines(text, start, count)
+    def check(r):
+        return check_translation(prompt, r, checklen, needsp)
+    return prompt, f"[{info}] {start + 1}/{len(text)}", check
+
+def translation_packs(text, groups, jobs, budget, job):
+    """Pack the groups and their `jobs` for `gemini.executor.apacked`.
+
+    `job(start, count)` makes the request for the lines of a pack.  Returns
+    the packs and the function splitting a reply into the replies of the
+    groups, each checked by its own job."""
+    grouped = pack_lines(text, groups, budget)
+    packs = []
+    for p in grouped:
+        start = packs[-1][1].stop if packs else 0
+        packs.append((job(p[0][0], sum(count for _, count in p)), range(start, start + len(p))))
+    def split(n, pq):
+        p = grouped[n]
+        results = unpack_translation(p, pq.result) if pq.result else [None] * len(p)
+        return [None if r is None or jobs[i][2](r) else r for i, r in zip(packs[n][1], results)]
+    return packs, split
+
+def split_lines(text, always3=False):
+    """Cut the lines of a canto into `(start, count)` groups of three,
+    extended to the end of a sentence unless `always3`."""
+    ret = []
+    current = 0
+    while current < len(text):
+        length = min(3, len(text) - current)
+        if not always3:
+            while current + length < len(text) and not text[current + length - 1].endswith("."):
+                length += 1
+        ret.append((current, length))
+        current += length
+    return ret
+
+def number_lines(text, start, count):
+    """Numbered lines for a prompt, with an empty line before each tercet."""
+    s = ""
+    for i in range(start, start + count):
+        if i == start or i % 3 == 0:
+            s += "\n"
+        s += f"\n{i + 1} {text[i]}"
+    return s
+
+def pack_lines(text, groups, budget):
+    """Join consecutive `(start, count)` groups into packs whose lines have
+    about `budget` tokens at most; a larger group makes a pack of its own."""
+    ret = []
+    tokens = 0
+    for start, count in groups:
+        # Rough estimate as in `ratelimit.estimate_tokens`
+        n = sum(len(text[i]) for i in range(start, start + count)) // 4 + 1
+        if ret and tokens + n <= budget:
+            ret[-1].append((start, count))
+            tokens += n
+        else:
+            ret.append([(start, count)])
+            tokens = n
+    return ret
+
+def unpack_translation(groups, r):
+    """Cut the reply to a pack into the replies of its `(start, count)` groups,
+    laid out as `number_lines`; None for a group whose line numbers are
+    missing, repeated or out of order.
+
+    Lines are read as `translate/split.py` does: a reply in two languages
+    has a `**Language**` heading before each one, and every group gets
+    both sections with their headings."""
+    sections = [[None, []]]
+    for line in r.split("\n"):
+        line = line.strip()
+        if re.match(r"\*\*.+\*\*$", line):
+            sections.append([line, []])
+        elif m := re.match(r"(\d+) [^ ]", line):
+            sections[-1][1].append((int(m.group(1)), line))
+    def cut(heading, numbered, start, count):
+        lines = [(n, line) for n, line in numbered if start < n <= start + count]
+        if [n for n, _ in lines] != list(range(start + 1, start + count + 1)):
+            return None
+        out = []
+        for n, line in lines:
+            if out and (n - 1) % 3 == 0:
+                out.append("")
+            out.append(line)
+        return "\n".join(([heading] if heading else []) + out)
+    sections = [s for s in sections if s[1]]
+    ret = []
+    for start, count in groups:
+        parts = [cut(heading, numbered, start, count) for heading, numbered in sections]
+        ret.append("\n\n".join(parts) if parts and None not in parts else None)
+    return ret
+
+def check_translation(prompt, r, checklen=3, needsp=False):
+    if len(r) > len(prompt) * checklen:
+        return f"Response too long: ({len(r)} > {len(prompt) * checklen})"
+    if needsp:
+        for line in r.split("\n"):
+            if m := re.match(r"(\d+)", line):
+                t = line[m.end():]
+                if not t.startswith(" ") or " " not in t[1:]:
+                    return f"Too few spaces: {repr(r)}"
+    return None
+
 # fix
 
 def read_fixes(*fix_files):
     ret = {}
     for f in fix_files:
-        for q in read_queries(f):
+        for q in iter_queries(f):
             info = q.info
             if re.search(r"\+\d$", info):
                 info = info[:-2]
@@ -1,6 +1,6 @@
-import sys, time
-from llm7shi.compat import generate_with_schema
-from . import common
+import sys, copy, time, math, asyncio, itertools, threading
+from contextlib import contextmanager
+from . import common, cache, ratelimit, hedge, replay
 
 # Set up the model
 generation_config = {
@@ -8,79 +8,442 @@ generation_config = {
     "temperature": 0.1,
 }
 
-chat_history = None
-chat_count = -1
 roles = ["user", "assistant"]
 
+def generate(messages, config):
+    # Imported on the first request, so that parsing options, --replay and
+    # --batch work without loading llm7shi.
+    from llm7shi.compat import generate_with_schema
+    return generate_with_schema(messages, show_params=False, **config)
+
+# Function that returns the response (with `text`) for `(messages, config)`;
+# replaced e.g. by `replay.backend` to run without a network.
+backend = generate
+
 MAX_CONSECUTIVE_ERRORS = 3
-error_count = 0
 
-def init(model, history=None, system=None, think=None):
-    global chat_history, chat_count
-    generation_config["model"] = model
-    chat_history = []
+def add_args(parser):
+    """Add the options of the query path: cache, rate limits, hedging and replay."""
+    cache.add_args(parser)
+    ratelimit.add_args(parser)
+    hedge.add_args(parser)
+    replay.add_args(parser)
+
+def apply(args):
+    cache.apply(args)
+    ratelimit.apply(args)
+    hedge.apply(args)
+    replay.apply(args)
+
+def set_model(config, model, think=None):
+    config["model"] = model
+    if think is None:
+        if "include_thoughts" in config:
+            del config["include_thoughts"]
+    else:
+        config["include_thoughts"] = think
+
+def make_history(history=None, system=None):
+    ret = []
     if system:
         # Gemma 3 via Gemini API does not support system prompts.
-        chat_history.append({"role": "user", "content": system.strip()})
+        ret.append({"role": "user", "content": system.strip()})
     if history:
         for i, h in enumerate(history):
-            chat_history.append({"role": roles[i % 2], "content": h.strip()})
-    if think is None:
-        if "include_thoughts" in generation_config:
-            del generation_config["include_thoughts"]
-    else:
-        generation_config["include_thoughts"] = think
-    chat_count = 0
+            ret.append({"role": roles[i % 2], "content": h.strip()})
+    return ret
 
-def query(prompt, info=None, show=False, retry=True, check=None):
-    global chat_history, chat_count, error_count
+def show_prompt(prompt, info=None):
+    print()
+    if info:
+        print(info)
+    for line in prompt.split("\n"):
+        print(">", line)
+
+def prepare(config, history, prompt, info=None, show=False):
     q = common.query()
     q.prompt = prompt.replace("\r\n", "\n").rstrip()
-    history = chat_history + [{"role": roles[0], "content": q.prompt}]
+    if model := config.get("model"):
+        q.metrics["model"] = model
+    messages = history + [{"role": roles[0], "content": q.prompt}]
     if info:
         q.info = info.strip()
+    config = config.copy()
+    if show:
+        show_prompt(prompt, info)
+        config.pop("file", None)
+    else:
+        config["file"] = None
+    return q, messages, config
+
+class meter:
+    """File-like wrapper for the streamed output that notes when it starts."""
+
+    def __init__(self, file):
+        self.file = file
+        self.first = None
+
+    def write(self, s):
+        if self.first is None and s.strip():
+            self.first = time.monotonic()
+        # `file` may be set to None by another thread (see `call`).
+        if file := self.file:
+            file.write(s)
+        return len(s)
+
+    def flush(self):
+        if file := self.file:
+            file.flush()
+
+def get_usage(response):
+    """Return the token counts reported with the response, if any."""
+    for r in [response, getattr(response, "response", None),
+              *reversed(getattr(response, "chunks", None) or [])]:
+        if u := getattr(r, "usage_metadata", None):
+            # Gemini
+            counts = [u.prompt_token_count, u.candidates_token_count,
+                      getattr(u, "thoughts_token_count", None)]
+        elif u := getattr(r, "usage", None):
+            # OpenAI-compatible
+            details = getattr(u, "completion_tokens_details", None)
+            counts = [u.prompt_tokens, u.completion_tokens,
+                      getattr(details, "reasoning_tokens", None)]
+        else:
+            continue
+        return {k: v for k, v in zip(["input", "output", "thoughts"], counts) if v is not None}
+    return {}
+
+def request(messages, config, m):
+    """Call the backend streaming to the `meter` m; returns the response and
+    the time to its first output."""
+    start = time.monotonic()
+    response = backend(messages, {**config, "file": m})
+    hedge.record(config.get("model"), time.monotonic() - start)
+    return response, None if m.first is None else m.first - start
+
+def call(q, messages, config, check=None):
+    """Call the backend and note time to first token and token counts in `q`.
+
+    With hedging on, a slow call gets a duplicate (see `hedge`)."""
+    file = config.get("file", sys.stdout)
+    m = meter(file)
+    if hedge.percentile > 0:
+        model = config.get("model")
+        def duplicate():
+            # Neither call is streamed from now on: the first one may keep
+            # running in the background after the duplicate has won.
+            m.file = None
+            ratelimit.acquire(model, messages)
+            return request(messages, config, meter(None))
+        def ok(result):
+            return not check or not check(result[0].text.rstrip())
+        (response, ttft), hedged = hedge.run(
+            model, lambda: request(messages, config, m), duplicate, ok)
+        if hedged:
+            q.metrics["hedged"] = q.metrics.get("hedged", 0) + 1
+            if file:
+                # The stream was cut off; show the answer taken.
+                print("\n(hedged)", file=file)
+                print(response.text, file=file)
+    else:
+        response, ttft = request(messages, config, m)
+    if ttft is not None:
+        q.metrics["ttft"] = round(ttft, 3)
+    # Tokens add up over retries, all of them are spent.
+    for k, v in get_usage(response).items():
+        q.metrics[k] = q.metrics.get(k, 0) + v
+    return response.text
+
+def measure(q, start, tries):
+    q.metrics["time"] = round(time.monotonic() - start, 3)
+    q.metrics["tries"] = tries
+
+def accept(q, config, messages, text, cached=False, check=None):
+    r = text.rstrip()
+    if check and (e := check(r)):
+        raise(Exception(e))
+    q.result = r
+    if not cached:
+        cache.put(config, messages, text)
+    elif config.get("file", sys.stdout):
+        # Show what the backend would have streamed.
+        print(text)
+    messages.append({"role": roles[1], "content": text})
+
+def reject(q, e, show=False):
+    err = str(e).rstrip()
     if show:
         print()
-        if info:
-            print(info)
-        for line in prompt.split("\n"):
-            print(">", line)
-        if "file" in generation_config:
-            del generation_config["file"]
+    print(err)
+    q.error = err
+
+def countdown(delay):
+    """Show the retry countdown; yields the seconds to sleep between updates."""
+    while True:
+        print(f"\rRetrying... {math.ceil(delay)}s ", end="", file=sys.stderr, flush=True)
+        if delay <= 0:
+            break
+        step = delay - math.ceil(delay) + 1
+        yield step
+        delay -= step
+    print(file=sys.stderr)
+
+def next_delay(config, q, e, i):
+    """Return None to stop retrying, otherwise the delay before the next try."""
+    if ratelimit.is_rate_limit(e):
+        tries = ratelimit.max_rate_tries
     else:
-        generation_config["file"] = None
-    for i in range(3):
+        tries = ratelimit.max_tries
+    if i >= tries:
+        return None
+    q.retry = True
+    return ratelimit.backoff(config.get("model"), i, e)
+
+async def asend(config, history, prompt, info=None, show=False, retry=True, check=None):
+    """Send one prompt after `history`; the request runs in a worker thread.
+
+    Wall time and attempts are recorded in `q.metrics` unless the response
+    came from the cache.  Returns the query and the extended history (None
+    on failure)."""
+    q, messages, config = prepare(config, history, prompt, info, show)
+    start = time.monotonic()
+    delay = 0
+    for i in itertools.count(1):
         if q.retry:
             if show:
                 print()
-            for j in range(5, -1, -1):
-                print(f"\rRetrying... {j}s ", end="", file=sys.stderr, flush=True)
-                if j:
-                    time.sleep(1)
-            print(file=sys.stderr)
+            for step in countdown(delay):
+                await asyncio.sleep(step)
         try:
-            response = generate_with_schema(history, show_params=False, **generation_config)
-            r = response.text.rstrip()
-            if check and (e := check(r)):
-                raise(Exception(e))
-            q.result = r
-            chat_count += 1
-            chat_history = history
-            chat_history.append({"role": roles[1], "content": response.text})
-            break
+            # A cached response is only tried first; retries go to the backend.
+            text = None if q.retry else cache.get(config, messages)
+            cached = text is not None
+            if not cached:
+                await ratelimit.aacquire(config.get("model"), messages)
+                text = await asyncio.to_thread(call, q, messages, config, check)
+            accept(q, config, messages, text, cached, check)
+            if not cached:
+                measure(q, start, i)
+            return q, messages
         except Exception as e:
-            err = str(e).rstrip()
-            if show:
-                print()
-            print(err)
-            q.error = err
-            if not retry:
+            measure(q, start, i)
+            reject(q, e, show)
+            if not retry or (delay := next_delay(config, q, e, i)) is None:
                 break
-            q.retry = True
+    return q, None
+
+def send(config, history, prompt, info=None, show=False, retry=True, check=None):
+    """`asend` for sequential scripts (not to be called from a running event loop)."""
+    return asyncio.run(asend(config, history, prompt, info, show, retry, check))
+
+def count_error(q, errors):
     if q.result:
-        error_count = 0
-    else:
-        error_count += 1
-        if 0 < MAX_CONSECUTIVE_ERRORS <= error_count:
-            raise Exception(f"Maximum consecutive errors reached: {MAX_CONSECUTIVE_ERRORS}")
-    return q
+        return 0
+    errors += 1
+    if 0 < MAX_CONSECUTIVE_ERRORS <= errors:
+        raise Exception(f"Maximum consecutive errors reached: {MAX_CONSECUTIVE_ERRORS}")
+    return errors
+
+class session:
+    """One conversation with a model.
+
+    The few-shot history is kept as a prefix that `reset` returns to.
+    With a token `budget`, only the most recent turns that fit in it are
+    kept after the prefix, so the prompt size stays flat.  Consecutive
+    errors are counted per session."""
+
+    def __init__(self, model, history=None, system=None, think=None, budget=0):
+        self.config = generation_config.copy()
+        set_model(self.config, model, think)
+        # Shared by every session copied from a pool and sent unchanged at the
+        # head of each request, so backend prefix caches keep hitting.
+        self.prefix = make_history(history, system)
+        self.budget = budget
+        self.errors = 0
+        self.reset()
+
+    def reset(self):
+        self.history = self.prefix
+        self.count = 0
+
+    def trim(self, history):
+        """Drop the oldest turns after the prefix while over the budget."""
+        if self.budget <= 0:
+            return history
+        turns = history[len(self.prefix):]
+        while turns and ratelimit.estimate_tokens(self.prefix + turns) > self.budget:
+            turns = turns[2:]
+        return self.prefix + turns
+
+    def update(self, q, history):
+        if history:
+            self.count += 1
+            self.history = self.trim(history)
+        self.errors = count_error(q, self.errors)
+        return q
+
+    def query(self, prompt, info=None, show=False, retry=True, check=None):
+        return self.update(*send(self.config, self.history, prompt, info, show, retry, check))
+
+    async def aquery(self, prompt, info=None, show=False, retry=True, check=None):
+        return self.update(*await asend(self.config, self.history, prompt, info, show, retry, check))
+
+class pool:
+    """Warm sessions sharing one model and few-shot history.
+
+    Sessions are handed out one per caller (thread or task) and keep their
+    conversation when returned, so it continues across cantos; a session is
+    reset once it has answered `interval` queries (never if 0)."""
+
+    def __init__(self, model, history=None, system=None, think=None, interval=1, budget=0):
+        self.template = session(model, history, system, think, budget)
+        self.interval = max(0, interval)
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        s = copy.copy(self.template)
+        s.reset()
+        return s
+
+    def put(self, s):
+        if self.interval and s.count >= self.interval:
+            s.reset()
+        with self.lock:
+            self.idle.append(s)
+
+    @contextmanager
+    def session(self):
+        s = self.get()
+        try:
+            yield s
+        finally:
+            self.put(s)
+
+# Default session for simple sequential scripts
+current = None
+
+def init(model, history=None, system=None, think=None, budget=0):
+    global current
+    current = session(model, history, system, think, budget)
+
+def query(prompt, info=None, show=False, retry=True, check=None):
+    return current.query(prompt, info, show, retry, check)
+
+async def aquery(prompt, info=None, show=False, retry=True, check=None):
+    return await current.aquery(prompt, info, show, retry, check)
+
+def show_result(q):
+    show_prompt(q.prompt, q.info)
+    print(q.result or q.error)
+
+class executor:
+    """Run queries with up to `workers` requests in flight.
+
+    Jobs are `(prompt, info, check)` tuples.  They are cut into blocks of
+    `interval` jobs (one block if 0), and every block is a conversation of
+    its own on a session from the pool, starting from the few-shot history
+    just like a chat reset in the sequential loop.  Jobs given as
+    `common.query` objects are passed through unchanged.  Results are
+    returned in input order."""
+
+    def __init__(self, model, history=None, system=None, think=None, interval=1, workers=1, budget=0):
+        self.sessions = pool(model, history, system, think, interval, budget)
+        self.interval = self.sessions.interval
+        self.workers = max(1, workers)
+        self.semaphore = asyncio.Semaphore(self.workers)
+
+    def blocks(self, jobs):
+        """Cut the jobs to run into blocks of `(index, job)`."""
+        todo = [(i, job) for i, job in enumerate(jobs) if not isinstance(job, common.query)]
+        if not self.interval:
+            return [todo] if todo else []
+        return [todo[i:i + self.interval] for i in range(0, len(todo), self.interval)]
+
+    async def arun(self, jobs, show, retry, journal=None):
+        ret = []
+        async with self.semaphore:
+            with self.sessions.session() as s:
+                s.reset()
+                for i, (prompt, info, check) in jobs:
+                    ret.append(q := await s.aquery(prompt, info, show, retry, check))
+                    if journal:
+                        journal.add(i, q)
+        return ret
+
+    async def amap(self, jobs, show=False, retry=True, journal=None):
+        """Run the jobs and return the list of results.
+
+        Answered queries are appended to `journal` (a `journal.writer`) as
+        they return, and jobs found there are skipped."""
+        jobs = list(jobs)
+        if journal:
+            jobs = journal.resume(jobs)
+        stream = show and self.workers == 1
+        tasks = [asyncio.create_task(self.arun(b, stream, retry, journal)) for b in self.blocks(jobs)]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            raise
+        it = (q for qs in results for q in qs)
+        ret = []
+        for job in jobs:
+            if isinstance(job, common.query):
+                ret.append(job)
+            else:
+                ret.append(q := next(it))
+                if show and not stream:
+                    show_result(q)
+        return ret
+
+    async def apacked(self, jobs, packs, split, show=False, retry=True, journal=None):
+        """Run packed requests and split their answers back into one query per job.
+
+        `packs` are `(job, indices)` pairs: a request covering the jobs at
+        `indices`.  `split(n, q)` returns the result for each job of the
+        n-th pack from its answered query `q`, None where it does not fit;
+        those jobs are sent again on their own."""
+        packed = await self.amap([job for job, _ in packs], show, retry, journal)
+        qs = [None] * len(jobs)
+        fallback = []
+        unclaimed = {}  # first job of a pack without accepted jobs -> metrics of the pack
+        for n, ((_, indices), pq) in enumerate(zip(packs, packed)):
+            metrics = pq.metrics
+            for i, r in zip(indices, split(n, pq)):
+                if r is None:
+                    fallback.append(i)
+                    continue
+                prompt, info, _ = jobs[i]
+                q = common.query()
+                q.info = info.strip()
+                q.prompt = prompt.rstrip()
+                q.result = r
+                # The request is counted once, with the first accepted job of its pack.
+                q.metrics = metrics or {"model": self.sessions.template.config["model"]}
+                metrics = None
+                qs[i] = q
+            if metrics and indices:
+                unclaimed[indices[0]] = metrics
+        if fallback:
+            print(f"{jobs[0][1]}: {len(fallback)}/{len(jobs)} sent again", file=sys.stderr)
+            # Answered packs are passed through, so journal indices stay unique.
+            retried = await self.amap(packed + [jobs[i] for i in fallback], show, retry, journal)
+            for i, q in zip(fallback, retried[len(packed):]):
+                for k, v in unclaimed.get(i, {}).items():
+                    # The failed pack adds to the cost of its first job sent again.
+                    if k not in ("model", "ttft"):
+                        q.metrics[k] = round(q.metrics.get(k, 0) + v, 3)
+                qs[i] = q
+        return qs
+
+    def render(self, writer, jobs):
+        """Write jobs to a `batch.writer` instead of running them.
+
+        Every request carries the few-shot history only."""
+        template = self.sessions.template
+        writer.add(template.config, template.prefix, jobs)
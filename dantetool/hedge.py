@@ -0,0 +1,88 @@
+"""Hedged requests: send a duplicate of a slow request, take the first good answer.
+
+The latency of every backend call is noted per model.  With `--hedge P`,
+a request still running after the P-th percentile of the recent latencies
+of its model gets a duplicate, and whichever answer arrives first and
+passes the check is used.  `--hedge-budget` caps the duplicates as a
+fraction of all requests.  The losing call cannot be cancelled; it runs
+to its end in the background and its answer is dropped.
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+percentile = 0    # 0 = no hedging
+budget = 0.05     # at most this fraction of requests is duplicated
+min_samples = 20  # latencies needed before the percentile is trusted
+window = 200      # recent latencies kept per model
+
+lock = threading.Lock()
+latencies = {}  # model -> recent latencies in seconds
+requests = 0
+hedges = 0
+
+def add_args(parser):
+    parser.add_argument("--hedge", dest="hedge", type=float, default=percentile,
+                        help="send a duplicate of a request still running after this percentile "
+                             "of the model's latencies, e.g. 95 (default: off)")
+    parser.add_argument("--hedge-budget", dest="hedge_budget", type=float, default=budget,
+                        help=f"maximum fraction of requests that get a duplicate (default: {budget})")
+
+def apply(args):
+    global percentile, budget
+    percentile = args.hedge
+    budget = args.hedge_budget
+
+def record(model, seconds):
+    with lock:
+        latencies.setdefault(model, deque(maxlen=window)).append(seconds)
+
+def threshold(model):
+    """Return the latency after which to hedge, or None while still learning."""
+    with lock:
+        xs = sorted(latencies.get(model, ()))
+    if len(xs) < min_samples:
+        return None
+    return xs[min(len(xs) - 1, int(len(xs) * percentile / 100))]
+
+def allow():
+    """Take one duplicate out of the budget if there is room."""
+    global hedges
+    with lock:
+        if hedges + 1 > budget * requests:
+            return False
+        hedges += 1
+        return True
+
+def start(func):
+    """Run `func()` in a daemon thread, so an abandoned call never blocks exit."""
+    f = Future()
+    def run():
+        try:
+            f.set_result(func())
+        except BaseException as e:
+            f.set_exception(e)
+    threading.Thread(target=run, daemon=True).start()
+    return f
+
+def run(model, primary, duplicate, ok):
+    """Return the result of `primary()` and whether a duplicate was sent.
+
+    If `primary` is slow, `duplicate()` is started as well and the first
+    result for which `ok(result)` holds wins.  If neither passes, the
+    outcome of `primary` is returned (or raised)."""
+    global requests
+    with lock:
+        requests += 1
+    first = start(primary)
+    limit = threshold(model)
+    if limit is None or wait([first], timeout=limit).done or not allow():
+        return first.result(), False
+    pending = {first, start(duplicate)}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            if f.exception() is None and ok(f.result()):
+                return f.result(), True
+    return first.result(), True
@@ -0,0 +1,148 @@
+"""SQLite index of the canto XML files of all stages and models.
+
+Every query of `<stage>/<model>/<cantica>/NN.xml` is a row with its stage,
+model, language (LANG of the model's Makefile), cantica, canto, line range
+and status.  The files are tracked by size and modification time, so an
+update only reads the files that have changed since the last one.
+"""
+
+import os, glob, json, sqlite3
+from . import common
+
+# Paths are stored absolute, so one database serves every checkout.
+default = os.path.join(os.path.expanduser("~"), ".cache", "dantetool", "index.db")
+
+schema = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime INTEGER
+);
+CREATE TABLE IF NOT EXISTS queries (
+    path TEXT,
+    pos INTEGER,
+    dir TEXT,
+    stage TEXT,
+    model TEXT,
+    language TEXT,
+    cantica TEXT,
+    canto INTEGER,
+    line INTEGER,
+    last INTEGER,
+    status TEXT,
+    info TEXT,
+    prompt TEXT,
+    result TEXT,
+    error TEXT,
+    retry INTEGER,
+    metrics TEXT,
+    PRIMARY KEY (path, pos)
+);
+CREATE INDEX IF NOT EXISTS queries_line ON queries (cantica, canto, line, last);
+CREATE INDEX IF NOT EXISTS queries_stage ON queries (stage, model, language, cantica, canto);
+CREATE INDEX IF NOT EXISTS queries_dir ON queries (dir, cantica, canto);
+CREATE INDEX IF NOT EXISTS queries_status ON queries (status);
+"""
+
+columns = ["path", "pos", "dir", "stage", "model", "language", "cantica", "canto", "line", "last",
+           "status", "info", "prompt", "result", "error", "retry", "metrics"]
+
+def connect(path=default):
+    if dir := os.path.dirname(path):
+        os.makedirs(dir, exist_ok=True)
+    con = sqlite3.connect(path)
+    con.executescript(schema)
+    return con
+
+def find_files(path):
+    """Return the canto files (<cantica>/NN.xml) under a directory, or the file itself."""
+    if not os.path.isdir(path):
+        path = os.path.abspath(path)
+        return [path] if os.path.basename(os.path.dirname(path)) in common.directories else []
+    ret = []
+    for d in common.directories:
+        ret += glob.glob(os.path.join(path, "**", d, "[0-9][0-9].xml"), recursive=True)
+    return sorted(os.path.abspath(f) for f in ret)
+
+def status(q):
+    if q.error == "(skip)":
+        return "skip"
+    return "ok" if q.result else "error"
+
+languages = {}
+
+def language(dir):
+    if dir not in languages:
+        mk = os.path.join(dir, "Makefile")
+        languages[dir] = common.read_defs(mk).get("LANG", "") if os.path.exists(mk) else ""
+    return languages[dir]
+
+def rows(file):
+    """Return the rows of the queries in a canto file."""
+    cdir = os.path.dirname(file)
+    dir = os.path.dirname(cdir)
+    stage = os.path.basename(os.path.dirname(dir))
+    model = os.path.basename(dir)
+    cantica = os.path.basename(cdir)
+    canto = int(os.path.basename(file)[:2])
+    qs = common.read_queries(file)
+    lines = []
+    for q in qs:
+        info = common.parse_info(q.info or "")
+        lines.append((info[2], info[3]) if info else (None, None))
+    ret = []
+    for i, q in enumerate(qs):
+        line, total = lines[i]
+        # A query runs up to the line before the next one.
+        last = next((l - 1 for l, _ in lines[i + 1:] if l), total)
+        ret.append((file, i, dir, stage, model, language(dir), cantica, canto, line, last,
+                    status(q), q.info, q.prompt, q.result, q.error, int(q.retry),
+                    json.dumps(q.metrics) if q.metrics else None))
+    return ret
+
+def update(con, paths):
+    """Bring the index up to date with the canto files under `paths`.
+    Return the numbers of files read and removed."""
+    files = {f for path in paths for f in find_files(path)}
+    roots = [os.path.abspath(p) for p in paths if os.path.isdir(p)]
+    known = {path: (size, mtime) for path, size, mtime in con.execute("SELECT path, size, mtime FROM files")}
+    read = 0
+    for file in sorted(files):
+        st = os.stat(file)
+        if known.get(file) == (st.st_size, st.st_mtime_ns):
+            continue
+        rs = rows(file)
+        with con:
+            con.execute("DELETE FROM queries WHERE path = ?", (file,))
+            con.executemany(f"INSERT INTO queries VALUES ({', '.join('?' * len(columns))})", rs)
+            con.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (file, st.st_size, st.st_mtime_ns))
+        read += 1
+    removed = [f for f in known if f not in files
+               and any(f.startswith(os.path.join(r, "")) for r in roots)]
+    with con:
+        for file in removed:
+            con.execute("DELETE FROM queries WHERE path = ?", (file,))
+            con.execute("DELETE FROM files WHERE path = ?", (file,))
+    return read, len(removed)
+
+def to_query(row):
+    """Make a query of a row with the columns `info, prompt, result, error, retry, metrics`."""
+    q = common.query()
+    q.info, q.prompt, q.result, q.error, retry, metrics = row
+    q.retry = bool(retry)
+    q.metrics = json.loads(metrics) if metrics else {}
+    return q
+
+def lookup(con, dir, cantica=None, canto=None):
+    """Map info to query for the answered queries of a model directory,
+    optionally only of one canto."""
+    sql = "SELECT info, prompt, result, error, retry, metrics FROM queries WHERE dir = ? AND result != ''"
+    params = [os.path.abspath(dir)]
+    if cantica:
+        sql += " AND cantica = ? AND canto = ?"
+        params += [cantica, canto]
+    ret = {}
+    for row in con.execute(sql + " ORDER BY path, pos", params):
+        if row[0]:
+            ret[row[0]] = to_query(row)
+    return ret
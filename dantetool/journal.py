@@ -0,0 +1,67 @@
+"""Write-ahead journal of answered queries for one output file.
+
+While a canto is processed, every answered query is appended to
+`<NN.xml>.journal` as soon as it returns, together with its index in the
+job list.  When the run is interrupted, the next run takes these queries
+from the journal instead of asking again, and the journal is removed once
+`NN.xml` has been written.
+"""
+
+import sys, os, threading, xml7shi
+from . import common
+
+def read(path):
+    """Map job index to query; an entry torn by a crash is ignored."""
+    with open(path, "r", encoding="utf-8") as f:
+        xr = xml7shi.reader(f.read())
+    ret = {}
+    while xr.read():
+        if xr.tag == "entry" and (index := xr.get("index", "")).isdigit():
+            index = int(index)
+            if xr.read() and xr.tag == "query":
+                q = common.parse(xr)
+                if xr.read() and xr.tag == "/entry":
+                    ret[index] = q
+    return ret
+
+class writer:
+    def __init__(self, xml):
+        self.xml = xml
+        self.path = xml + ".journal"
+        self.done = read(self.path) if os.path.exists(self.path) else {}
+        self.file = None
+        self.lock = threading.Lock()
+
+    def resume(self, jobs):
+        """Replace `(prompt, info, check)` jobs answered in the journal by their queries."""
+        ret = []
+        for i, job in enumerate(jobs):
+            q = self.done.get(i)
+            if (q and q.result and not isinstance(job, common.query)
+                    and q.prompt == job[0].replace("\r\n", "\n").strip()):
+                ret.append(q)
+            else:
+                ret.append(job)
+        if count := sum(1 for a, b in zip(jobs, ret) if a is not b):
+            print(f"{self.path}: resumed {count} queries", file=sys.stderr)
+        return ret
+
+    def add(self, index, q):
+        if not q.result:
+            return
+        with self.lock:
+            if not self.file:
+                self.file = open(self.path, "ab")
+            common.write(self.file, f'<entry index="{index}">')
+            common.write(self.file, q, end="")
+            common.write(self.file, "</entry>")
+            self.file.flush()
+
+    def close(self):
+        """Close the journal, and remove it if the output has been written."""
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+        if os.path.exists(self.xml) and os.path.exists(self.path):
+            os.remove(self.path)
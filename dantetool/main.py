@@ -1,6 +1,7 @@
 import sys
 import argparse
-from .commands import compare, concat, fix, pickup, redo, replace, show, strip
+from . import sidecar
+from .commands import batch_ingest, batch_run, bench, compare, concat, fix, index, pickup, pipeline, redo, replace, run, show, stats, strip, sweep
 
 def main():
     parser = argparse.ArgumentParser(
@@ -8,8 +9,25 @@ def main():
         description="Tools for Dante's Divine Comedy translation project"
     )
 
+    sidecar.add_args(parser)
+
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
+    # batch-ingest subcommand
+    batch_ingest_parser = subparsers.add_parser("batch-ingest", help="Write batch results into query XML files")
+    batch_ingest.add_args(batch_ingest_parser)
+    batch_ingest_parser.set_defaults(func=batch_ingest.main_func)
+
+    # batch-run subcommand
+    batch_run_parser = subparsers.add_parser("batch-run", help="Process a batch request file locally")
+    batch_run.add_args(batch_run_parser)
+    batch_run_parser.set_defaults(func=batch_run.main_func)
+
+    # bench subcommand
+    bench_parser = subparsers.add_parser("bench", help="Benchmark the codecs of query files")
+    bench.add_args(bench_parser)
+    bench_parser.set_defaults(func=bench.main_func)
+
     # compare subcommand
     compare_parser = subparsers.add_parser("compare", help="Compare word tables from different models")
     compare.add_args(compare_parser)
@@ -25,11 +43,21 @@ def main():
     fix.add_args(fix_parser)
     fix_parser.set_defaults(func=fix.main_func)
 
+    # index subcommand
+    index_parser = subparsers.add_parser("index", help="Index query files of all stages and models in SQLite")
+    index.add_args(index_parser)
+    index_parser.set_defaults(func=index.main_func)
+
     # pickup subcommand
     pickup_parser = subparsers.add_parser("pickup", help="Pick up error queries from XML files")
     pickup.add_args(pickup_parser)
     pickup_parser.set_defaults(func=pickup.main_func)
 
+    # pipeline subcommand
+    pipeline_parser = subparsers.add_parser("pipeline", help="Run stages canto by canto as a pipeline")
+    pipeline.add_args(pipeline_parser)
+    pipeline_parser.set_defaults(func=pipeline.main_func)
+
     # redo subcommand
     redo_parser = subparsers.add_parser("redo", help="Redo error queries")
     redo.add_args(redo_parser)
@@ -40,17 +68,33 @@ def main():
     replace.add_args(replace_parser)
     replace_parser.set_defaults(func=replace.main_func)
 
+    # run subcommand
+    run_parser = subparsers.add_parser("run", help="Translate with several models and languages at once")
+    run.add_args(run_parser)
+    run_parser.set_defaults(func=run.main_func)
+
     # show subcommand
     show_parser = subparsers.add_parser("show", help="Show translation from XML file")
     show.add_args(show_parser)
     show_parser.set_defaults(func=show.main_func)
 
+    # stats subcommand
+    stats_parser = subparsers.add_parser("stats", help="Report query metrics per model, stage and canto")
+    stats.add_args(stats_parser)
+    stats_parser.set_defaults(func=stats.main_func)
+
     # strip subcommand
     strip_parser = subparsers.add_parser("strip", help="Strip table content from XML files")
     strip.add_args(strip_parser)
     strip_parser.set_defaults(func=strip.main_func)
 
+    # sweep subcommand
+    sweep_parser = subparsers.add_parser("sweep", help="Retry error queries at rising temperatures")
+    sweep.add_args(sweep_parser)
+    sweep_parser.set_defaults(func=sweep.main_func)
+
     args = parser.parse_args()
+    sidecar.apply(args)
 
     if hasattr(args, "func"):
         return args.func(args)
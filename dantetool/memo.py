@@ -0,0 +1,115 @@
+"""Row memo for table stages (word-tr, etymology).
+
+A row of a table prompt is keyed on its input cells (e.g. word and lemma);
+the cells the model fills in are remembered per key.  The store belongs to
+one output directory, which has one model and one set of target columns,
+and is seeded from the tables already written there.  Rows already known
+are filled locally and only the others are sent; a table whose rows are
+all known is not sent at all.
+"""
+
+import os, glob, threading
+from . import common
+
+def split_prompt(prompt):
+    """Split a prompt into the text before its table and the table."""
+    lines = prompt.split("\n")
+    for i, line in enumerate(lines):
+        if line.startswith("|"):
+            return "\n".join(lines[:i]), common.read_table("\n".join(lines[i:]))
+    return prompt, None
+
+class store:
+    def __init__(self, width, model=None):
+        self.width = width  # number of input columns
+        self.model = model
+        self.rows = {}
+        self.lock = threading.Lock()
+        self.known = 0
+        self.sent = 0
+
+    def key(self, row):
+        return tuple(row[:self.width])
+
+    def add(self, table, keys=None):
+        """Remember the filled rows of a table (only those in `keys` if given)."""
+        with self.lock:
+            for row in table[2:]:
+                key = self.key(row)
+                if len(row) > self.width and any(row[self.width:]) and (keys is None or key in keys):
+                    self.rows[key] = row[self.width:]
+
+    def load(self, directory):
+        """Seed the store with the tables written under `directory`."""
+        for xml in glob.glob(os.path.join(directory, "*", "*.xml")):
+            for q in common.iter_queries(xml):
+                if q.result and (table := common.read_table(q.result)):
+                    self.add(table)
+        print(f"memo: {len(self.rows)} rows from {directory}")
+
+    def get(self, row):
+        with self.lock:
+            return self.rows.get(self.key(row))
+
+    def reduce(self, job):
+        """Return the job with the known rows left out of its table, or a
+        query answered from the store if every row is known."""
+        if isinstance(job, common.query):
+            return job
+        prompt, info, check = job
+        text, table = split_prompt(prompt)
+        if not table:
+            return job
+        todo = []
+        for row in table[2:]:
+            if not self.get(row) and self.key(row) not in todo:
+                todo.append(self.key(row))
+        with self.lock:
+            self.known += len(table) - 2 - len(todo)
+            self.sent += len(todo)
+        if not todo:
+            q = common.query()
+            q.info = info.strip()
+            q.prompt = prompt.rstrip()
+            q.result = self.fill(table)
+            if self.model:
+                q.metrics["model"] = self.model
+            return q
+        if len(todo) == len(table) - 2:
+            return job
+        blank = [""] * (len(table[0]) - self.width)
+        sent = table[:2] + [list(key) + blank for key in todo]
+        def check_rows(r):
+            if check and (e := check(r)):
+                return e
+            rows = [self.key(row) for row in (common.read_table(r) or [])[2:]]
+            if rows != todo:
+                return f"Rows do not match the table: {len(rows)} rows for {len(todo)}"
+            return None
+        return text + "\n" + common.table_to_string(sent), info, check_rows
+
+    def fill(self, table):
+        """Fill the rows of a prompt table from the store."""
+        ret = table[:2]
+        for row in table[2:]:
+            ret.append(row[:self.width] + (self.get(row) or [""] * (len(row) - self.width)))
+        return common.table_to_string(ret)
+
+    def merge(self, job, sent, q):
+        """Learn from the answer `q` to `sent` (made from `job` by `reduce`),
+        and return it as the query for the whole table of `job`."""
+        if isinstance(sent, common.query):
+            return q
+        prompt = job[0]
+        _, table = split_prompt(prompt)
+        if q.result and (answer := common.read_table(q.result)):
+            self.add(answer, {self.key(row) for row in table[2:]})
+            if sent is not job:
+                q.result = self.fill(table)
+        # Errors are retried later with the whole table.
+        q.prompt = prompt.rstrip()
+        return q
+
+    def report(self):
+        if total := self.known + self.sent:
+            print(f"memo: {self.known}/{total} rows filled locally")
@@ -1,8 +1,14 @@
-import sys, os
+import sys, os, asyncio
+from . import common, sidecar
+from .batch import writer as batch_writer
+from .journal import writer as journal_writer
 
-directories = ["inferno", "purgatorio", "paradiso"]
+directories = common.directories
 init = "init.xml"
 interval = 10
+history_tokens = 0
+parallel = 1
+jobs = 1
 rangemin = 1
 rangemax = 35
 once  = False
@@ -13,8 +19,11 @@ model = None
 language = None
 srcdir = None
 outdir = None
+batch = None
+journal = None
 
 def parse(parser):
+    from . import gemini
     parser.add_argument("-d", dest="directories", type=str,
                         help="specify sub directory (comma-separated)")
     parser.add_argument("-i", dest="init", type=str, default=init,
@@ -22,7 +31,13 @@ def parse(parser):
     parser.add_argument("-m", dest="model", type=str, required=True,
                         help="specify model name (required)")
     parser.add_argument("-n", dest="interval", type=int, default=interval,
-                        help=f"specify interval (default: {interval})")
+                        help=f"specify chat reset interval, 0 for none (default: {interval})")
+    parser.add_argument("--history-tokens", dest="history_tokens", type=int, default=history_tokens,
+                        help="keep only the recent turns within this many tokens after the few-shot history (default: unlimited)")
+    parser.add_argument("-p", dest="parallel", type=int, default=parallel,
+                        help=f"specify number of concurrent queries per canto (default: {parallel})")
+    parser.add_argument("-j", dest="jobs", type=int, default=jobs,
+                        help=f"specify number of cantos processed at once (default: {jobs})")
     parser.add_argument("-a", dest="rangemin", type=int, default=rangemin,
                         help=f"specify range min (default: {rangemin})")
     parser.add_argument("-r", dest="rangemax", type=int, default=rangemax,
@@ -35,6 +50,10 @@ def parse(parser):
                         help="don't show queries and responses")
     parser.add_argument("--no-think", dest="think", action="store_false", default=None,
                         help="don't include thoughts in response")
+    parser.add_argument("--batch", dest="batch", type=str,
+                        help="write pending requests to a JSONL batch file instead of querying")
+    gemini.add_args(parser)
+    sidecar.add_args(parser)
     parser.add_argument("language", type=str,
                         help="target language")
     parser.add_argument("srcdir", type=str,
@@ -43,12 +62,16 @@ def parse(parser):
                         help="output directory")
 
 def apply(args):
-    global directories, init, interval, rangemin, rangemax, once, retry, show, think, model, language, srcdir, outdir
+    global directories, init, interval, history_tokens, parallel, jobs, rangemin, rangemax, once, retry, show, think, model, language, srcdir, outdir, batch
+    from . import gemini
 
     if args.directories:
         directories = args.directories.split(',')
     init = args.init
     interval = args.interval
+    history_tokens = args.history_tokens
+    parallel = args.parallel
+    jobs = max(1, args.jobs)
     rangemin = args.rangemin
     rangemax = args.rangemax
     once = args.once
@@ -59,32 +82,79 @@ def apply(args):
     language = args.language
     srcdir = args.srcdir
     outdir = args.outdir
+    gemini.apply(args)
+    sidecar.apply(args)
 
     if not os.path.exists(outdir):
         os.mkdir(outdir)
+    if args.batch:
+        batch = batch_writer(args.batch)
 
-def proc(f):
-    global directory, canto, info
-    for directory in directories:
-        diru = directory[0].upper() + directory[1:]
-        srcpath = os.path.join(srcdir, directory)
-        if not os.path.exists(srcpath):
-            continue
-        outpath = os.path.join(outdir, directory)
-        if not os.path.exists(outpath):
-            os.mkdir(outpath)
-        for canto in range(rangemin, rangemax + 1):
-            src = os.path.join(srcpath, f"{canto:02}.xml")
+def list_cantos(srcdir, dirs, rangemin, rangemax):
+    """List `(directory, canto, src)` of the source cantos in the range."""
+    ret = []
+    for d in dirs:
+        for c in range(rangemin, rangemax + 1):
+            src = os.path.join(srcdir, d, f"{c:02}.xml")
             if not os.path.exists(src):
                 src = src[:-3] + "txt"
             if not os.path.exists(src):
                 break
-            xml = os.path.join(outpath, f"{canto:02}.xml")
-            if os.path.exists(xml):
-                continue
-            print()
-            info = f"{diru} Canto {canto}"
-            print("#", info)
-            f(src, xml)
-            if once:
-                sys.exit(0)
+            ret.append((d, c, src))
+    return ret
+
+def find_cantos():
+    """List `(directory, canto, src, xml)` of the cantos still to be done."""
+    ret = []
+    for d, c, src in list_cantos(srcdir, directories, rangemin, rangemax):
+        outpath = os.path.join(outdir, d)
+        if not os.path.exists(outpath):
+            os.mkdir(outpath)
+        xml = os.path.join(outpath, f"{c:02}.xml")
+        if os.path.exists(xml):
+            continue
+        ret.append((d, c, src, xml))
+        if once:
+            return ret
+    return ret
+
+def select(d, c):
+    global directory, canto, info
+    directory = d
+    canto = c
+    diru = directory[0].upper() + directory[1:]
+    print()
+    info = f"{diru} Canto {canto}"
+    print("#", info)
+
+def finish():
+    if batch:
+        batch.close()
+    if once:
+        sys.exit(0)
+
+def aproc(f):
+    """Run the coroutine function `f(src, xml)` for every canto still to be done.
+
+    Up to `jobs` cantos run at once, longest first.  The globals set per
+    canto (`directory`, `canto`, `info`, `journal`) are only valid in `f`
+    until its first `await`."""
+    async def run_canto(d, c, src, xml):
+        global journal
+        select(d, c)
+        journal = j = journal_writer(xml)
+        await f(src, xml)
+        j.close()
+
+    async def worker(todo):
+        while todo:
+            await run_canto(*todo.pop(0))
+
+    async def run():
+        todo = find_cantos()
+        if jobs > 1:
+            # Without a long canto left for the end, the workers finish together.
+            todo.sort(key=lambda t: os.path.getsize(t[2]), reverse=True)
+        await asyncio.gather(*(worker(todo) for _ in range(jobs)))
+    asyncio.run(run())
+    finish()
@@ -0,0 +1,161 @@
+import os, re, json, time, random, asyncio, threading
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory file locks (Windows): the bucket is shared between threads only.
+    fcntl = None
+
+# Token-bucket limits shared by all processes through one lock file per model.
+rpm = 0  # requests per minute (0 = unlimited)
+tpm = 0  # input tokens per minute (0 = unlimited)
+directory = os.path.join(os.path.expanduser("~"), ".cache", "dantetool-ratelimit")
+
+# Exponential backoff between retries
+max_tries = 3       # attempts for ordinary errors
+max_rate_tries = 10 # attempts while the server reports a rate limit
+base_delay = 5.0
+max_delay = 120.0
+
+lock = threading.Lock()
+
+def add_args(parser):
+    parser.add_argument("--rpm", dest="rpm", type=int, default=rpm,
+                        help="limit requests per minute across processes (default: unlimited)")
+    parser.add_argument("--tpm", dest="tpm", type=int, default=tpm,
+                        help="limit input tokens per minute across processes (default: unlimited)")
+
+def apply(args):
+    global rpm, tpm
+    rpm = args.rpm
+    tpm = args.tpm
+
+def estimate_tokens(messages):
+    # Rough estimate; the limiter only needs to be in the right ballpark.
+    return sum(len(m["content"]) for m in messages) // 4 + 1
+
+def get_path(model):
+    name = re.sub(r"[^\w.-]", "_", model or "default")
+    return os.path.join(directory, name + ".lock")
+
+def read(model):
+    """Return the shared state under a shared lock, without writing it."""
+    try:
+        f = open(get_path(model), "r", encoding="utf-8")
+    except FileNotFoundError:
+        return {}
+    with f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_SH)
+        try:
+            return json.loads(f.read())
+        except ValueError:
+            return {}
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def update(model, func):
+    """Run `func(state, now)` on the shared state under the file lock;
+    the file is written only if the state has changed."""
+    os.makedirs(directory, exist_ok=True)
+    with lock, open(get_path(model), "a+", encoding="utf-8") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            data = f.read()
+            try:
+                state = json.loads(data)
+            except ValueError:
+                state = {}
+            ret = func(state, time.time())
+            if (new := json.dumps(state)) != data:
+                f.seek(0)
+                f.truncate()
+                f.write(new)
+                f.flush()
+            return ret
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def reserve(model, tokens):
+    """Take one request and `tokens` from the buckets.
+
+    Returns 0 on success, otherwise the seconds to wait before trying again."""
+    if rpm <= 0 and tpm <= 0:
+        # No buckets to take from: only a hold set by `hold` can delay.
+        return max(0, read(model).get("until", 0) - time.time())
+    def take(state, now):
+        if (until := state.get("until", 0)) > now:
+            return until - now
+        dt = now - state.get("time", now)
+        state["time"] = now
+        wait = 0
+        for key, limit, need in [("requests", rpm, 1), ("tokens", tpm, tokens)]:
+            if limit <= 0:
+                continue
+            level = min(limit, state.get(key, limit) + dt * limit / 60)
+            state[key] = level
+            # A request larger than the whole bucket waits for a full bucket.
+            need = min(need, limit)
+            if level < need:
+                wait = max(wait, (need - level) * 60 / limit)
+        if wait == 0:
+            if rpm > 0:
+                state["requests"] -= 1
+            if tpm > 0:
+                state["tokens"] -= min(tokens, tpm)
+        return wait
+    return update(model, take)
+
+def hold(model, seconds):
+    """Make every process wait `seconds` before its next request."""
+    def set_until(state, now):
+        state["until"] = max(state.get("until", 0), now + seconds)
+    update(model, set_until)
+
+def acquire(model, messages):
+    tokens = estimate_tokens(messages)
+    while wait := reserve(model, tokens):
+        time.sleep(wait)
+
+async def aacquire(model, messages):
+    tokens = estimate_tokens(messages)
+    while wait := reserve(model, tokens):
+        await asyncio.sleep(wait)
+
+def retry_after(e):
+    """Return the delay requested by the server in seconds, or None."""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        try:
+            if (value := headers.get("retry-after")) is not None:
+                return float(value)
+        except (TypeError, ValueError):
+            pass
+    s = str(e)
+    # Gemini: 'retryDelay': '37s', OpenAI-compatible: "Please try again in 1.5s"
+    for pattern in [r"retryDelay['\"]?:\s*['\"]?([\d.]+)s",
+                    r"retry[- ]after:?\s*([\d.]+)",
+                    r"try again in ([\d.]+)\s*s"]:
+        if m := re.search(pattern, s, re.IGNORECASE):
+            return float(m.group(1))
+    return None
+
+def is_rate_limit(e):
+    s = str(e)
+    return bool(re.search(r"\b429\b|RESOURCE_EXHAUSTED|rate.?limit|quota", s, re.IGNORECASE))
+
+def backoff(model, attempt, e):
+    """Return the delay before retry number `attempt` (1-based) after error `e`."""
+    hint = retry_after(e)
+    if hint is not None:
+        # Tell the other processes as well, so they don't overshoot again.
+        hold(model, hint)
+        return hint + random.uniform(0, 1)
+    delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+    # Equal jitter: keep at least half of the delay, randomize the rest.
+    return delay / 2 + random.uniform(0, delay / 2)
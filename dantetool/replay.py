@@ -0,0 +1,75 @@
+"""Replay backend: answer prompts from already generated query XML files.
+
+Used to benchmark and test the pipeline without a network, e.g.:
+
+    uv run word.py --replay 'gemma3-it/*/*.xml' --replay-latency 2 -m gemma3 ...
+"""
+
+import sys, os, glob, time, random
+from types import SimpleNamespace
+from . import common
+
+paths = []
+latency = 0.0
+error_rate = 0.0
+
+def add_args(parser):
+    parser.add_argument("--replay", dest="replay", action="append", default=[],
+                        help="answer from recorded XML files instead of the model "
+                             "(file, directory or glob; can be specified multiple times)")
+    parser.add_argument("--replay-latency", dest="replay_latency", type=float, default=latency,
+                        help=f"mean latency of replayed responses in seconds (default: {latency})")
+    parser.add_argument("--replay-errors", dest="replay_errors", type=float, default=error_rate,
+                        help=f"rate of injected errors (default: {error_rate})")
+
+def apply(args):
+    global paths, latency, error_rate
+    paths = args.replay
+    latency = args.replay_latency
+    error_rate = args.replay_errors
+    if paths:
+        from . import cache, gemini
+        gemini.backend = backend(paths, latency, error_rate)
+        # Replayed and synthetic responses must not end up in the cache.
+        cache.enabled = False
+
+def find_files(path):
+    if os.path.isdir(path):
+        return glob.glob(os.path.join(path, "**", "*.xml"), recursive=True)
+    return glob.glob(path, recursive=True)
+
+def synthesize(prompt):
+    """Build a plausible reply: the table or the numbered lines of the prompt."""
+    table = common.read_table(prompt)
+    if table:
+        return common.table_to_string(table)
+    return "\n".join(raw for _, _, raw in common.extract_numbered_lines(prompt))
+
+class backend:
+    def __init__(self, paths, latency=0.0, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.index = {}
+        files = sorted({f for p in paths for f in find_files(p)})
+        for f in files:
+            for q in common.iter_queries(f):
+                if q.prompt and q.result:
+                    self.index[q.prompt] = q.result
+        self.hits = 0
+        self.misses = 0
+        print(f"replay: {len(self.index)} responses from {len(files)} files", file=sys.stderr)
+
+    def __call__(self, messages, config):
+        if self.latency > 0:
+            time.sleep(random.expovariate(1 / self.latency))
+        if random.random() < self.error_rate:
+            raise Exception("replay: injected error")
+        prompt = messages[-1]["content"]
+        if (text := self.index.get(prompt)) is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            text = synthesize(prompt)
+        if (file := config.get("file", sys.stdout)) is not None:
+            print(text, file=file)
+        return SimpleNamespace(text=text)
@@ -0,0 +1,129 @@
+"""Parse cache of query XML files.
+
+The queries parsed from an XML file are kept in a binary sidecar (marshal)
+under `directory`, named after the absolute path of the file, together
+with the size, modification time and SHA-256 of the source.  The next read
+loads the sidecar instead of parsing if the size and modification time
+still match, or, for a file rewritten with the same content (e.g. by
+`strip`), if the size and hash do.  Only `common.read_queries` uses it;
+streaming reads (`common.iter_queries`) always parse, holding one query at
+a time.
+"""
+
+import sys, os, hashlib, marshal, threading
+
+enabled = True
+directory = os.path.join(os.path.expanduser("~"), ".cache", "dantetool", "parsed")
+max_file_size = 1 << 25  # bytes; larger files are only parsed
+max_size = 1 << 28  # bytes; least recently used sidecars are evicted beyond this
+
+# Stored with the data; marshal may change between Python versions.
+version = (1, *sys.version_info[:2])
+
+lock = threading.Lock()
+total_size = None
+
+def add_args(parser):
+    parser.add_argument("--no-parse-cache", dest="parse_cache", action="store_false", default=True,
+                        help="don't use the parse cache of query files")
+    parser.add_argument("--parse-cache-dir", dest="parse_cache_dir", type=str, default=directory,
+                        help=f"specify parse cache directory (default: {directory})")
+
+def apply(args):
+    global enabled, directory
+    enabled = args.parse_cache
+    directory = args.parse_cache_dir
+
+def get_path(file):
+    key = hashlib.sha256(os.path.abspath(file).encode("utf_8")).hexdigest()
+    return os.path.join(directory, key[:2], key + ".bin")
+
+def stamp(file):
+    """Return `(size, mtime)` of a file to cache, or None."""
+    if not enabled:
+        return None
+    try:
+        st = os.stat(file)
+    except OSError:
+        return None
+    if st.st_size > max_file_size:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+def digest(file):
+    h = hashlib.sha256()
+    with open(file, "rb") as f:
+        while data := f.read(1 << 20):
+            h.update(data)
+    return h.hexdigest()
+
+def load(file, st):
+    """Return the rows stored for `file` with `st` from `stamp`, or None."""
+    path = get_path(file)
+    try:
+        with open(path, "rb") as f:
+            v, (size, mtime, h), rows = marshal.loads(f.read())
+        if v != version or size != st[0]:
+            return None
+        if mtime != st[1]:
+            if digest(file) != h:
+                return None
+            write(file, (size, st[1], h), rows)
+        else:
+            # The modification time orders sidecars for LRU eviction.
+            os.utime(path)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    return rows
+
+def save(file, st, rows):
+    """Store the rows parsed from `file` after `stamp` returned `st`."""
+    try:
+        h = digest(file)
+        # Not if the file has changed while it was parsed.
+        if stamp(file) == st:
+            write(file, (*st, h), rows)
+    except OSError:
+        pass
+
+def write(file, key, rows):
+    path = get_path(file)
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(tmp_file, "wb") as f:
+        f.write(marshal.dumps((version, key, rows)))
+    size = os.path.getsize(tmp_file)
+    os.replace(tmp_file, path)
+    global total_size
+    with lock:
+        if total_size is None:
+            total_size = sum(size for _, size, _ in scan())
+        else:
+            total_size += size
+        if total_size > max_size:
+            evict()
+
+def scan():
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith(".bin"):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+def evict():
+    """Remove least recently used sidecars down to 90% of `max_size`."""
+    global total_size
+    entries = sorted(scan())
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total_size <= max_size * 0.9:
+            break
+        try:
+            os.remove(path)
+            total_size -= size
+        except OSError:
+            pass
@@ -0,0 +1,228 @@
+"""
+Tests for reading and writing query files.
+Run with: uv run pytest dantetool
+"""
+import pytest
+from xml.parsers import expat
+from dantetool import common
+
+def make_query(n, **fields):
+    q = common.query()
+    q.info = f"[Inferno Canto 1] {n}/136"
+    q.prompt = f"Create a word table.\n\n{n} Nel mezzo del cammin di nostra vita"
+    q.result = f"| Word | Lemma |\n|---|---|\n| Nel | in+il |\n| mezzo | {n} |"
+    for k, v in fields.items():
+        setattr(q, k, v)
+    return q
+
+def make_queries():
+    return [
+        make_query(1, metrics={"model": "google:gemma-3-27b-it", "time": 1.5, "ttft": 0.25,
+                               "input": 120, "output": 80, "tries": 2}),
+        make_query(4, result=None, error="Rows do not match the table"),
+        make_query(7, error="(skip)", result=None, retry=True),
+        make_query(10, error="| bad | table |", metrics={"model": "ollama:gpt-oss:120b"}),
+        make_query(13, info=None, prompt="Tant' è amara & più \"morte\"", result="perché è così"),
+    ]
+
+def write(path, qs, **attrs):
+    common.write_queries(str(path), qs, count=len(qs), **attrs)
+    return str(path)
+
+def rows(qs):
+    return [common.to_row(q) for q in qs]
+
+class TestCodecs:
+    """expat and xml7shi give the same queries."""
+
+    @pytest.mark.parametrize("size", [16, 100, 1 << 16])
+    def test_parity(self, tmp_path, size):
+        file = write(tmp_path / "01.xml", make_queries())
+        expected = rows(common.xml7shi_queries(file, size))
+        assert rows(common.expat_queries(file, size)) == expected
+        assert rows(common.parse_queries(file, size)) == expected
+
+    def test_fields(self, tmp_path):
+        qs = make_queries()
+        file = write(tmp_path / "01.xml", qs)
+        for name, codec in common.codecs.items():
+            read = list(codec(file))
+            assert [q.info for q in read] == [q.info for q in qs], name
+            assert [q.error for q in read] == [q.error for q in qs], name
+            assert [q.retry for q in read] == [q.retry for q in qs], name
+            assert [q.metrics for q in read] == [q.metrics for q in qs], name
+
+    def test_empty(self, tmp_path):
+        file = write(tmp_path / "01.xml", [])
+        for codec in common.codecs.values():
+            assert list(codec(file)) == []
+
+class TestEscape:
+    """Text written by `write_queries` reads back the same."""
+
+    def test_round_trip(self, tmp_path):
+        qs = make_queries()
+        file = write(tmp_path / "01.xml", qs)
+        for codec in common.codecs.values():
+            assert rows(codec(file)) == rows(qs)
+
+    def test_angle_brackets(self, tmp_path):
+        # `<` and `>` are stored doubly escaped and read back as entities.
+        file = write(tmp_path / "01.xml", [make_query(1, result="a < b > c &lt; d")])
+        for codec in common.codecs.values():
+            assert next(codec(file)).result == "a &lt; b &gt; c &lt; d"
+
+    def test_rewrite(self, tmp_path):
+        # Reading and writing again gives the same file, also with `<`.
+        qs = make_queries() + [make_query(16, result="| a < b | c > d | &lt; |")]
+        file = write(tmp_path / "01.xml", qs, whole=100)
+        data = open(file, "rb").read()
+        for codec in common.codecs.values():
+            write(tmp_path / "02.xml", list(codec(file)), whole=100)
+            assert open(tmp_path / "02.xml", "rb").read() == data
+
+class TestFallback:
+    """Files expat rejects are read on with xml7shi."""
+
+    @pytest.mark.parametrize("size", [16, 100, 1 << 16])
+    def test_truncated(self, tmp_path, size):
+        qs = make_queries()
+        data = open(write(tmp_path / "full.xml", qs), "rb").read()
+        for cut in range(0, len(data), 37):
+            file = tmp_path / "cut.xml"
+            file.write_bytes(data[:cut])
+            expected = rows(common.xml7shi_queries(str(file), size))
+            assert rows(common.parse_queries(str(file), size)) == expected
+            # Every query written before the cut is read.
+            complete = data[:cut].count(b"</query>")
+            assert expected[:complete] == rows(qs[:complete])
+
+    def test_truncated_expat(self, tmp_path):
+        data = open(write(tmp_path / "full.xml", make_queries()), "rb").read()
+        file = tmp_path / "cut.xml"
+        file.write_bytes(data[:len(data) // 2])
+        with pytest.raises(expat.ExpatError):
+            list(common.expat_queries(str(file)))
+
+    @pytest.mark.parametrize("size", [16, 100, 1 << 16])
+    def test_mid_file(self, tmp_path, size):
+        # An entity unknown to expat in the last query
+        qs = make_queries()
+        data = open(write(tmp_path / "01.xml", qs), "rb").read()
+        data = data.replace(b"perch\xc3\xa8", b"perch&egrave;")
+        file = tmp_path / "02.xml"
+        file.write_bytes(data)
+        read = rows(common.parse_queries(str(file), size))
+        assert read == rows(common.xml7shi_queries(str(file), size))
+        assert len(read) == len(qs)
+        assert read[:4] == rows(qs[:4])
+
+    def test_concatenated(self, tmp_path):
+        # Two roots, e.g. files joined with cat
+        a = open(write(tmp_path / "a.xml", make_queries()[:3]), "rb").read()
+        b = open(write(tmp_path / "b.xml", make_queries()[3:]), "rb").read()
+        file = tmp_path / "ab.xml"
+        file.write_bytes(a + b)
+        assert rows(common.parse_queries(str(file), 64)) == rows(make_queries())
+
+    def test_crlf(self, tmp_path):
+        qs = make_queries()
+        data = open(write(tmp_path / "lf.xml", qs), "rb").read()
+        file = tmp_path / "crlf.xml"
+        file.write_bytes(data.replace(b"\n", b"\r\n"))
+        for codec in common.codecs.values():
+            assert rows(codec(str(file))) == rows(qs)
+        assert rows(common.parse_queries(str(file))) == rows(qs)
+
+    def test_crlf_truncated(self, tmp_path):
+        data = open(write(tmp_path / "lf.xml", make_queries()), "rb").read()
+        file = tmp_path / "crlf.xml"
+        file.write_bytes(data.replace(b"\n", b"\r\n")[:len(data) // 2])
+        assert (rows(common.parse_queries(str(file), 100))
+                == rows(common.xml7shi_queries(str(file), 100)))
+
+class TestAppender:
+    """Files written one query at a time."""
+
+    def test_crashed(self, tmp_path):
+        # Read before `close`, as left by a crash
+        qs = make_queries()
+        a = common.appender(str(tmp_path / "01.xml"))
+        for i, q in enumerate(qs):
+            a.add(q)
+            assert rows(common.parse_queries(a.file)) == rows(qs[:i + 1])
+        assert a.count == len(qs)
+        assert a.errors == 2
+
+    def test_closed(self, tmp_path):
+        qs = make_queries()
+        a = common.appender(str(tmp_path / "01.xml"))
+        for q in qs:
+            a.add(q)
+        a.close(count=a.count, whole=100)
+        data = open(write(tmp_path / "02.xml", qs, whole=100), "rb").read()
+        assert open(a.file, "rb").read() == data
+
+    def test_nothing(self, tmp_path):
+        a = common.appender(str(tmp_path / "01.xml"))
+        a.close(count=0)
+        assert not (tmp_path / "01.xml").exists()
+
+class TestPack:
+    """Groups packed into one request and the reply split back."""
+
+    text = [f"verso {i + 1}" + ("." if i % 4 == 3 else ",") for i in range(20)]
+
+    def test_pack_lines(self):
+        groups = common.split_lines(self.text)
+        packs = common.pack_lines(self.text, groups, 25)
+        assert [g for p in packs for g in p] == groups
+        tokens = lambda s, c: sum(len(t) for t in self.text[s:s + c]) // 4 + 1
+        assert all(len(p) == 1 or sum(tokens(s, c) for s, c in p) <= 25 for p in packs)
+        assert len(packs) < len(groups)
+
+    def test_large_group(self):
+        groups = common.split_lines(self.text)
+        assert common.pack_lines(self.text, groups, 1) == [[g] for g in groups]
+
+    def test_unpack(self):
+        # A reply laid out like the prompt gives the replies of single groups.
+        groups = common.split_lines(self.text)
+        for p in common.pack_lines(self.text, groups, 30):
+            start, count = p[0][0], sum(c for _, c in p)
+            reply = common.number_lines(self.text, start, count)
+            assert common.unpack_translation(p, reply) == [
+                common.number_lines(self.text, s, c).strip() for s, c in p]
+
+    def test_missing(self):
+        groups = [(0, 3), (3, 3), (6, 2)]
+        reply = "\n".join(f"{i} line {i}" for i in range(1, 9) if i != 5)
+        ret = common.unpack_translation(groups, reply)
+        assert ret[0] == "1 line 1\n2 line 2\n3 line 3"
+        assert ret[1] is None
+        assert ret[2] == "7 line 7\n8 line 8"
+
+    def test_order(self):
+        groups = [(0, 3), (3, 3)]
+        reply = "1 a\n3 c\n2 b\n4 d\n5 e\n6 f\n6 f"
+        assert common.unpack_translation(groups, reply) == [None, None]
+
+    def test_other_lines(self):
+        # Text around the numbered lines and empty translations are ignored.
+        groups = [(0, 3)]
+        reply = "Here is the translation:\n\n1 a\n2 b\n\n3 c\n4\n"
+        assert common.unpack_translation(groups, reply) == ["1 a\n2 b\n3 c"]
+
+    def test_two_languages(self):
+        # Each group gets its lines of both sections, with the headings.
+        groups = [(0, 3), (3, 2)]
+        reply = "\n".join(["**English**"] + [f"{i} en {i}" for i in range(1, 6)] + [""]
+                          + ["**Japanese**"] + [f"{i} ja {i}" for i in range(1, 6)])
+        assert common.unpack_translation(groups, reply) == [
+            "**English**\n1 en 1\n2 en 2\n3 en 3\n\n**Japanese**\n1 ja 1\n2 ja 2\n3 ja 3",
+            "**English**\n4 en 4\n5 en 5\n\n**Japanese**\n4 ja 4\n5 ja 5"]
+
+    def test_two_languages_missing(self):
+        groups = [(0, 3), (3, 2)]
+        reply = "**English**\n1 a\n2 b\n3 c\n4 d\n5 e\n**Japanese**\n1 a\n2 b\n3 c\n4 d"
+        assert common.unpack_translation(groups, reply)[1] is None
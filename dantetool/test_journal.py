@@ -0,0 +1,112 @@
+"""
+Tests for the journal of answered queries.
+Run with: uv run pytest dantetool
+"""
+from dantetool import common, journal
+
+def make_job(n):
+    return f"Create a word table.\n\n{n} Nel mezzo del cammin di nostra vita", f"[Inferno Canto 1] {n}/136", None
+
+def answer(job, result="| Word |\n|---|\n| Nel |"):
+    q = common.query()
+    q.prompt, q.info, _ = job
+    q.result = result
+    q.metrics = {"model": "google:gemma-3-27b-it", "time": 1.5}
+    return q
+
+def rows(qs):
+    return [common.to_row(q) for q in qs]
+
+class TestRead:
+    """Entries written by `writer.add`."""
+
+    def test_entries(self, tmp_path):
+        xml = str(tmp_path / "01.xml")
+        jobs = [make_job(n) for n in [1, 4, 7]]
+        w = journal.writer(xml)
+        w.add(2, answer(jobs[2]))
+        w.add(0, answer(jobs[0], "| a & b |"))
+        w.close()
+        done = journal.read(w.path)
+        assert sorted(done) == [0, 2]
+        assert rows([done[0], done[2]]) == rows([answer(jobs[0], "| a & b |"), answer(jobs[2])])
+
+    def test_errors_not_written(self, tmp_path):
+        xml = str(tmp_path / "01.xml")
+        w = journal.writer(xml)
+        w.add(0, answer(make_job(1), None))
+        w.close()
+        assert not (tmp_path / "01.xml.journal").exists()
+
+    def test_torn(self, tmp_path):
+        # A crash in the middle of the last entry
+        xml = str(tmp_path / "01.xml")
+        w = journal.writer(xml)
+        w.add(0, answer(make_job(1)))
+        w.add(1, answer(make_job(4)))
+        w.close()
+        data = open(w.path, "rb").read()
+        for cut in range(data.index(b'<entry index="1">'), len(data) - len(b"</entry>\n"), 7):
+            (tmp_path / "cut.journal").write_bytes(data[:cut])
+            assert sorted(journal.read(str(tmp_path / "cut.journal"))) == [0]
+
+class TestResume:
+    """Answered jobs are taken from the journal of a previous run."""
+
+    def test_resume(self, tmp_path):
+        xml = str(tmp_path / "01.xml")
+        jobs = [make_job(n) for n in [1, 4, 7, 10]]
+        w = journal.writer(xml)
+        w.add(0, answer(jobs[0]))
+        w.add(2, answer(jobs[2]))
+        w.close()
+
+        w = journal.writer(xml)
+        ret = w.resume(jobs)
+        assert ret[1] is jobs[1] and ret[3] is jobs[3]
+        assert rows([ret[0], ret[2]]) == rows([answer(jobs[0]), answer(jobs[2])])
+
+    def test_changed_prompt(self, tmp_path):
+        xml = str(tmp_path / "01.xml")
+        w = journal.writer(xml)
+        w.add(0, answer(make_job(1)))
+        w.close()
+        jobs = [make_job(2)]
+        assert journal.writer(xml).resume(jobs)[0] is jobs[0]
+
+    def test_crlf_prompt(self, tmp_path):
+        xml = str(tmp_path / "01.xml")
+        job = make_job(1)
+        w = journal.writer(xml)
+        w.add(0, answer(job))
+        w.close()
+        jobs = [(job[0].replace("\n", "\r\n") + "\n", *job[1:])]
+        assert isinstance(journal.writer(xml).resume(jobs)[0], common.query)
+
+    def test_passed_through(self, tmp_path):
+        # Queries given as jobs are not replaced.
+        xml = str(tmp_path / "01.xml")
+        job = make_job(1)
+        w = journal.writer(xml)
+        w.add(0, answer(job))
+        w.close()
+        q = answer(job, "| other |")
+        assert journal.writer(xml).resume([q])[0] is q
+
+class TestClose:
+    """The journal is removed once the output is written."""
+
+    def test_kept(self, tmp_path):
+        xml = str(tmp_path / "01.xml")
+        w = journal.writer(xml)
+        w.add(0, answer(make_job(1)))
+        w.close()
+        assert (tmp_path / "01.xml.journal").exists()
+
+    def test_removed(self, tmp_path):
+        xml = str(tmp_path / "01.xml")
+        w = journal.writer(xml)
+        w.add(0, answer(make_job(1)))
+        common.write_queries(xml, [answer(make_job(1))], count=1)
+        w.close()
+        assert not (tmp_path / "01.xml.journal").exists()
@@ -27,6 +27,11 @@ check:
 	uv run dantetool strip --strict --validate-source $(SRCDIR) --validate-column 1 $(DIRSM)/*.xml
 	uv run dantetool pickup 1-error.xml $(DIRSM)/*.xml
 
+## Run and validate one canto (e.g. make canto D=inferno N=5), used by dantetool pipeline
+canto: init.xml
+	uv run $(SUBDIR)/etymology.py $(OPTIONS) -d $(D) -a $(N) -r $(N) -m $(MODEL) "$(LANG)" $(SRCDIR) . $(FIXES)
+	uv run dantetool strip --fail-on-error --strict --validate-source $(SRCDIR) --validate-column 1 $(D)/$(shell printf %02d $(N)).xml
+
 
 # Error recovery
 
@@ -38,17 +43,9 @@ redo:
 replace:
 	uv run dantetool replace 1-error-ok.xml $(DIRSM)/*.xml
 
-## Automatically retry with increasing temperature (0.1 to 1.0)
+## Automatically retry with increasing temperature (0.1 to 1.0), bypassing the response cache
 redo-sweep:
-	@for t in 0.{1..9} 1.0; do \
-		echo "Retrying with temperature $$t..."; \
-		$(MAKE) redo OPTIONS="-t $$t" || exit 1; \
-		$(MAKE) replace check; \
-		if grep -q 'count="0"' 1-error.xml; then \
-			echo "No errors remaining at temperature $$t"; \
-			break; \
-		fi; \
-	done
+	uv run dantetool sweep $(OPTIONS) -n 1 -m $(MODEL) --validate-source $(SRCDIR) --validate-column 1 1-error.xml $(DIRSM)/*.xml
 
 ## Fix error prompts with current source data
 fix:
@@ -18,6 +18,8 @@ parser.add_argument("--init", dest="do_init", action="store_true",
                     help="create init.xml and exit")
 parser.add_argument("--fix", dest="fix_files", action="append", default=[],
                     help="fix file (can be specified multiple times)")
+parser.add_argument("--memo", dest="memo", action="store_true",
+                    help="fill rows already answered in the output directory without asking again")
 
 args = parser.parse_args()
 option.apply(args)
@@ -26,6 +28,7 @@ derived = args.derived
 fields = [int(f) for f in args.fields.split(",")]
 
 from dantetool import common, gemini
+from dantetool.memo import store as memo_store
 
 fixes = common.read_fixes(*args.fix_files)
 
@@ -36,7 +39,7 @@ prompt_template = " ".join([
     'but leave blank if unknown.'
 ])
 
-def send(query, extra_prompt=""):
+def build(query, extra_prompt=""):
     prompt = prompt_template + extra_prompt
     if not query.result:
         q = common.query()
@@ -59,7 +62,14 @@ def send(query, extra_prompt=""):
             table.append([*rowf, "", ""])
     prompt += "\n\n"
     prompt += common.table_to_string(table)
-    return gemini.query(prompt, query.info, option.show, option.retry)
+    return prompt, query.info, None
+
+def send(query, extra_prompt=""):
+    job = build(query, extra_prompt)
+    if isinstance(job, common.query):
+        return job
+    prompt, info, check = job
+    return gemini.query(prompt, info, option.show, option.retry, check)
 
 if args.do_init:
     # If --init is specified: create init.xml and exit
@@ -81,16 +91,33 @@ elif not os.path.exists(option.init):
 init_qs = common.read_queries(option.init)
 history = common.unzip(init_qs)
 
-@option.proc
-def proc(src, xml):
+executor = gemini.executor(option.model, history, think=option.think,
+                           interval=option.interval, workers=option.parallel * option.jobs,
+                           budget=option.history_tokens)
+
+memo = None
+if args.memo:
+    memo = memo_store(len(fields), option.model)
+    memo.load(option.outdir)
+
+@option.aproc
+async def proc(src, xml):
     queries = common.read_queries(src)
-    qs = []
+    jobs = []
     for query in queries:
-        if not (0 <= gemini.chat_count < option.interval):
-            gemini.init(option.model, history, think=option.think)
         if not query.result and query.info in fixes:
             for q in fixes[query.info]:
-                qs.append(send(q))
+                jobs.append(build(q))
         else:
-            qs.append(send(query))
+            jobs.append(build(query))
+    if option.batch:
+        executor.render(option.batch, jobs)
+        return
+    if memo:
+        sent = [memo.reduce(job) for job in jobs]
+        qs = await executor.amap(sent, option.show, option.retry, option.journal)
+        qs = [memo.merge(job, s, q) for job, s, q in zip(jobs, sent, qs)]
+        memo.report()
+    else:
+        qs = await executor.amap(jobs, option.show, option.retry, option.journal)
     common.write_queries(xml, qs, count=len(qs))
@@ -1,9 +1,10 @@
-import sys, os, re
+import sys, os
 import argparse
 from dantetool import common, option
 
 needsp  = False
 always3 = False
+pack    = 0
 
 parser = argparse.ArgumentParser(
     description="Translate text using Gemini",
@@ -14,6 +15,8 @@ parser.add_argument("--need-space", dest="needsp", action="store_true",
                     help="require at least one space in each line")
 parser.add_argument("-3", dest="always3", action="store_true",
                     help="always send 3 lines")
+parser.add_argument("--pack", dest="pack", type=int, default=pack,
+                    help="pack whole sentences into requests of about this many source tokens (default: off)")
 parser.add_argument("--init", dest="do_init", action="store_true",
                     help="create init.xml and exit")
 
@@ -22,9 +25,10 @@ args = parser.parse_args()
 option.apply(args)
 needsp = args.needsp
 always3 = args.always3
+pack = args.pack
 do_init = args.do_init
 
-checklen = 6 if " and " in option.language else 3
+checklen = common.translation_checklen(option.language)
 
 from dantetool import gemini
 
@@ -34,32 +38,13 @@ with open(os.path.join(script_dir, "system.txt"), "r", encoding="utf-8") as f:
     SYSTEM_PROMPT = f.read().strip()
 
 text = []
-current = 0
 
-def send_lines(line_count, *plines):
-    global current
+def build_lines(start, line_count):
     diru = option.directory[0].upper() + option.directory[1:]
-    info = f"[{diru} Canto {option.canto}] {current + 1}/{len(text)}"
-    prompt = " ".join(plines)
-    for i in range(line_count):
-        if i == 0 or current % 3 == 0:
-            prompt += "\n"
-        line = f"{current + 1} {text[current]}"
-        prompt += "\n" + line
-        current += 1
-    def check(r):
-        if len(r) > len(prompt) * checklen:
-            return f"Response too long: ({len(r)} > {len(prompt) * checklen})"
-        if needsp:
-            for line in r.split("\n"):
-                if m := re.match(r"(\d+)", line):
-                    t = line[m.end():]
-                    if not t.startswith(" ") or " " not in t[1:]:
-                        return f"Too few spaces: {repr(r)}"
-        return None
-    return gemini.query(prompt, info, option.show, option.retry, check)
+    return common.translation_job(prompt, text, start, line_count, f"{diru} Canto {option.canto}",
+                                  checklen, needsp)
 
-prompt = f"Please translate each line literally into {option.language}."
+prompt = common.translation_prompt(option.language)
 
 if do_init:
     # If --init is specified: create init.xml and exit
@@ -67,12 +52,12 @@ if do_init:
     gemini.init(option.model, system=SYSTEM_PROMPT, think=option.think)
     option.directory = option.directories[0]
     option.canto = 1
-    file = os.path.join(option.srcdir, option.directory, f"01.txt")
-    with open(file, "r", encoding="utf-8") as f:
-        text = [l.split("|")[0] for line in f if (l := line.strip())]
+    text = common.read_lines(os.path.join(option.srcdir, option.directory, f"01.txt"))
     init_qs = []
+    start = 0
     for length in [3, 3, 3] if always3 else [3, 6]:
-        q = send_lines(length, prompt)
+        q = gemini.query(*build_lines(start, length), option.show, option.retry)
+        start += length
         if not q.result:
             print("Abort.", file=sys.stderr)
             sys.exit(1)
@@ -90,19 +75,23 @@ else:
 
 history = common.unzip(init_qs)
 
-@option.proc
-def proc(src, xml):
-    global text, current
-    with open(src, "r", encoding="utf-8") as f:
-        text = [l.split("|")[0] for line in f if (l := line.strip())]
-    current = 0
-    qs = []
-    while current < len(text):
-        if not (0 <= gemini.chat_count < option.interval):
-            gemini.init(option.model, history, system=SYSTEM_PROMPT, think=option.think)
-        length = min(3, len(text) - current)
-        if not always3:
-            while current + length < len(text) and not text[current + length - 1].endswith("."):
-                length += 1
-        qs.append(send_lines(length, prompt))
+executor = gemini.executor(option.model, history, system=SYSTEM_PROMPT, think=option.think,
+                           interval=option.interval, workers=option.parallel * option.jobs,
+                           budget=option.history_tokens)
+
+@option.aproc
+async def proc(src, xml):
+    global text
+    text = common.read_lines(src)
+    groups = common.split_lines(text, always3)
+    jobs = [build_lines(start, length) for start, length in groups]
+    if option.batch:
+        executor.render(option.batch, jobs)
+        return
+    if pack > 0:
+        # Groups whose lines do not come back are sent again on their own.
+        packs, split = common.translation_packs(text, groups, jobs, pack, build_lines)
+        qs = await executor.apacked(jobs, packs, split, option.show, option.retry, option.journal)
+    else:
+        qs = await executor.amap(jobs, option.show, option.retry, option.journal)
     common.write_queries(xml, qs, count=len(qs))
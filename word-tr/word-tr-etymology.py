@@ -0,0 +1,164 @@
+import sys
+import os
+import argparse
+from dantetool import option
+
+parser = argparse.ArgumentParser(
+    description="Translate word tables and look up etymology in one request using Gemini",
+    formatter_class=argparse.RawDescriptionHelpFormatter)
+
+option.interval = 3
+option.init = "init-etymology.xml"
+option.parse(parser)
+
+parser.add_argument("-t", "--translate", default="English,Italian",
+                    help="languages to translate (comma separated)")
+parser.add_argument("-f", "--fields", default="0,1",
+                    help="fields for columns (0-based, comma separated, use + for multiple)")
+parser.add_argument("-e", "--derived", default="Latin, Greek, Germanic",
+                    help="specify etymology language(s)")
+parser.add_argument("--etymology-fields", dest="etymology_fields", default="1",
+                    help="columns of the word-tr table for the etymology table, as -f of etymology.py (default: 1)")
+parser.add_argument("--etymology", dest="etymology", type=str, required=True,
+                    help="output directory of the etymology tables")
+parser.add_argument("--init", dest="do_init", action="store_true",
+                    help="create init-etymology.xml and exit")
+
+args = parser.parse_args()
+if args.batch:
+    parser.error("--batch is not supported, the results would not be split")
+option.apply(args)
+
+translate = [l.strip() for l in args.translate.split(",")]
+fields = [[int(f) for f in fs.split("+")] for fs in args.fields.split(",")]
+etymology_fields = [int(f) for f in args.etymology_fields.split(",")]
+derived = args.derived
+if max(etymology_fields) >= len(fields) + len(translate):
+    parser.error(f"--etymology-fields: the word-tr table has only {len(fields) + len(translate)} columns")
+
+from dantetool import common, gemini
+
+# The prompts of the separate stages, written to their outputs unchanged
+# so that `common.read_tables`, `check` and `redo` work as before.
+word_tr_prompt = " ".join([
+    f"For each row in the table, fill in the '{args.translate}' columns",
+    f"with the direct translation of the '{option.language}' column."
+])
+etymology_prompt = " ".join([
+    'For each row in the table, look up the etymology of the word.',
+    f'In the "Derived" column, write {derived}, etc.',
+    'In the "Etymology" column, fill in the corresponding word in Greek, Latin, or others,',
+    'but leave blank if unknown.'
+])
+prompt = " ".join([
+    f"For each row in the table, fill in the '{args.translate}' columns",
+    f"with the direct translation of the '{option.language}' column.",
+    'Then look up the etymology of the lemma.',
+    f'In the "Derived" column, write {derived}, etc.',
+    'In the "Etymology" column, fill in the corresponding word in Greek, Latin, or others,',
+    'but leave blank if unknown.'
+])
+
+def skip(info, p=prompt):
+    q = common.query()
+    q.info = info
+    q.prompt = p
+    q.error = "(skip)"
+    return q
+
+def build(query, extra_prompt=""):
+    if not query.result:
+        return skip(query.info)
+    flen = len(fields)
+    table = []
+    for i, row in enumerate(common.read_table(query.result)):
+        if i == 1:
+            table.append(["---"] * (flen + len(translate) + 2))
+            continue
+        m = max(max(fs) for fs in fields)
+        if len(row) <= m:
+            print(f"Warning: {len(row)} <= {m} @ {query.info}", file=sys.stderr)
+            continue
+        rowf = [" ".join(row[f].strip() for f in fs) for fs in fields]
+        if i == 0:
+            table.append([option.language, *rowf[1:], *translate, "Derived", "Etymology"])
+        elif common.has_alpha("".join(rowf)):
+            table.append(rowf + [""] * (len(translate) + 2))
+    p = prompt + extra_prompt + "\n\n" + common.table_to_string(table)
+    words = [row[:flen] for row in table[2:]]
+    def check(r):
+        rows = [row[:flen] for row in (common.read_table(r) or [])[2:]]
+        if rows != words:
+            return f"Rows do not match the table: {len(rows)} rows for {len(words)}"
+        return None
+    return p, query.info, check
+
+def split(q):
+    """Split a combined query into the word-tr and etymology queries."""
+    q1 = common.query()
+    q1.info = q.info
+    q1.metrics = q.metrics
+    q2 = common.query()
+    q2.info = q.info
+    q2.metrics = {"model": q.metrics["model"]} if "model" in q.metrics else {}
+    table = common.read_table(q.prompt)
+    width = len(table[0]) - 2
+    q1.prompt = word_tr_prompt + "\n\n" + common.table_to_string([row[:width] for row in table])
+    if q.result:
+        result = common.read_table(q.result)
+        q1.result = common.table_to_string([row[:width] for row in result])
+        # The etymology table as etymology.py builds it from the word-tr table.
+        head = [[option.language, *(table[0][f] for f in etymology_fields[1:]), "Derived", "Etymology"],
+                ["---"] * (len(etymology_fields) + 2)]
+        rows = [row + [""] * (width + 2 - len(row)) for row in result[2:]]
+        words = [[row[f] for f in etymology_fields] for row in rows]
+        q2.prompt = etymology_prompt + "\n\n" + common.table_to_string(head + [w + ["", ""] for w in words])
+        q2.result = common.table_to_string(head + [w + row[width:width + 2] for w, row in zip(words, rows)])
+    else:
+        q1.error = q2.error = q.error
+        q2.prompt = etymology_prompt
+    return q1, q2
+
+if args.do_init:
+    # If --init is specified: create init-etymology.xml and exit
+    print(f"making {option.init}...")
+    gemini.init(option.model, history=[], think=option.think)
+    inferno1 = common.read_queries(os.path.join(option.srcdir, option.directories[0], "01.xml"))
+    p, info, check = build(inferno1[0], "\nProvide only the table without any additional explanations or commentary outside the table.")
+    q = gemini.query(p, info, option.show, option.retry, check)
+    if not q.result:
+        print("Abort.", file=sys.stderr)
+        sys.exit(1)
+    q.result = common.fix_table(q.result)
+    init_qs = [q]
+    common.write_queries(option.init, init_qs, count=len(init_qs))
+    print(f"{option.init} created successfully.")
+    sys.exit(0)
+elif not os.path.exists(option.init):
+    print(f"Error: {option.init} not found. Please run with --init first.", file=sys.stderr)
+    sys.exit(1)
+
+init_qs = common.read_queries(option.init)
+history = common.unzip(init_qs)
+
+executor = gemini.executor(option.model, history, think=option.think,
+                           interval=option.interval, workers=option.parallel * option.jobs,
+                           budget=option.history_tokens)
+
+@option.aproc
+async def proc(src, xml):
+    xml2 = os.path.join(args.etymology, option.directory, os.path.basename(xml))
+    queries = common.read_queries(src)
+    jobs = [build(query) for query in queries]
+    qs = await executor.amap(jobs, option.show, option.retry, option.journal)
+    qs1, qs2 = [], []
+    for q in qs:
+        if q.error == "(skip)":
+            q1, q2 = skip(q.info, word_tr_prompt), skip(q.info, etymology_prompt)
+        else:
+            q1, q2 = split(q)
+        qs1.append(q1)
+        qs2.append(q2)
+    os.makedirs(os.path.dirname(xml2), exist_ok=True)
+    common.write_queries(xml2, qs2, count=len(qs2))
+    common.write_queries(xml, qs1, count=len(qs1))
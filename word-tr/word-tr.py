@@ -18,6 +18,8 @@ parser.add_argument("--init", dest="do_init", action="store_true",
                     help="create init.xml and exit")
 parser.add_argument("--fix", dest="fix_files", action="append", default=[],
                     help="fix file (can be specified multiple times)")
+parser.add_argument("--memo", dest="memo", action="store_true",
+                    help="fill rows already answered in the output directory without asking again")
 
 args = parser.parse_args()
 option.apply(args)
@@ -26,10 +28,11 @@ translate = [l.strip() for l in args.translate.split(",")]
 fields = [[int(f) for f in fs.split("+")] for fs in args.fields.split(",")]
 
 from dantetool import common, gemini
+from dantetool.memo import store as memo_store
 
 fixes = common.read_fixes(*args.fix_files)
 
-def send(query, extra_prompt=""):
+def build(query, extra_prompt=""):
     flen = len(fields)
     prompt = " ".join([
         f"For each row in the table, fill in the '{args.translate}' columns",
@@ -57,7 +60,14 @@ def send(query, extra_prompt=""):
             table.append(rowf + [""] * len(translate))
     prompt += "\n\n"
     prompt += common.table_to_string(table)
-    return gemini.query(prompt, query.info, option.show, option.retry)
+    return prompt, query.info, None
+
+def send(query, extra_prompt=""):
+    job = build(query, extra_prompt)
+    if isinstance(job, common.query):
+        return job
+    prompt, info, check = job
+    return gemini.query(prompt, info, option.show, option.retry, check)
 
 if args.do_init:
     # If --init is specified: create init.xml and exit
@@ -80,16 +90,33 @@ elif not os.path.exists(option.init):
 init_qs = common.read_queries(option.init)
 history = common.unzip(init_qs)
 
-@option.proc
-def proc(src, xml):
+executor = gemini.executor(option.model, history, think=option.think,
+                           interval=option.interval, workers=option.parallel * option.jobs,
+                           budget=option.history_tokens)
+
+memo = None
+if args.memo:
+    memo = memo_store(len(fields), option.model)
+    memo.load(option.outdir)
+
+@option.aproc
+async def proc(src, xml):
     queries = common.read_queries(src)
-    qs = []
+    jobs = []
     for query in queries:
-        if not (0 <= gemini.chat_count < option.interval):
-            gemini.init(option.model, history, think=option.think)
         if not query.result and query.info in fixes:
             for q in fixes[query.info]:
-                qs.append(send(q))
+                jobs.append(build(q))
         else:
-            qs.append(send(query))
+            jobs.append(build(query))
+    if option.batch:
+        executor.render(option.batch, jobs)
+        return
+    if memo:
+        sent = [memo.reduce(job) for job in jobs]
+        qs = await executor.amap(sent, option.show, option.retry, option.journal)
+        qs = [memo.merge(job, s, q) for job, s, q in zip(jobs, sent, qs)]
+        memo.report()
+    else:
+        qs = await executor.amap(jobs, option.show, option.retry, option.journal)
     common.write_queries(xml, qs, count=len(qs))
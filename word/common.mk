@@ -31,6 +31,11 @@ check:
 	uv run dantetool strip --validate-tokens --replace-prompt --italian-lemma 1 $(DIRSM)/*.xml
 	uv run dantetool pickup 1-error.xml $(DIRSM)/*.xml
 
+## Run and validate one canto (e.g. make canto D=inferno N=5), used by dantetool pipeline
+canto: init.xml
+	uv run $(SUBDIR)/word.py $(OPTIONS) -d $(D) -a $(N) -r $(N) -m $(MODEL) "$(LANG)" $(SRCDIR) .
+	uv run dantetool strip --fail-on-error --validate-tokens --replace-prompt --italian-lemma 1 $(D)/$(shell printf %02d $(N)).xml
+
 
 # Error recovery
 
@@ -42,6 +47,8 @@ redo:
 replace:
 	uv run dantetool replace 1-error-ok.xml $(DIRSM)/*.xml
 
+# Not `dantetool sweep`: that sends the stored prompts again, while redo
+# asks with the table skeleton that fix.py builds from tokenize/.
 ## Automatically retry with increasing temperature (0.1 to 1.0)
 redo-sweep:
 	@for t in 0.{1..9} 1.0; do \
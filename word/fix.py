@@ -56,8 +56,10 @@ def main(argv: list[str] | None = None) -> int:
     parser.add_argument("--no-think", dest="think", action="store_false", default=None, help="don't include thoughts")
     parser.add_argument("--no-show", dest="show", action="store_false", default=True, help="don't show prompts")
     parser.add_argument("--no-retry", dest="retry", action="store_false", default=True, help="don't retry")
+    gemini.add_args(parser)
     parser.add_argument("input", type=str, help="input XML file (e.g., 1-error.xml)")
     args = parser.parse_args(argv)
+    gemini.apply(args)
 
     if args.temperature is not None:
         gemini.generation_config["temperature"] = args.temperature
@@ -76,24 +78,25 @@ def main(argv: list[str] | None = None) -> int:
 
     tokenize_dir = Path(__file__).resolve().parent.parent / "tokenize"
 
-    qs_ok: list[common.query] = []
-    qs_ng: list[common.query] = []
+    # Results are appended as they come, and the headers completed at the end.
+    qs_ok = common.appender(ok_path)
+    qs_ng = common.appender(ng_path)
 
     def error(q, msg=None):
         if msg:
             print(f"\nError {q.info}: {msg}", file=sys.stderr)
             if q.error is None:
                 q.error = msg
-        qs_ng.append(q)
-        common.write_queries(ng_path, qs_ng, error=sum(1 for x in qs_ng if not x.result), count=len(qs_ng))
+        qs_ng.add(q)
 
     count = sum(1 for q in in_qs if not is_skip(q))
     done = 0
+    chat = gemini.session(args.model, history, think=args.think)
 
     for q in in_qs:
         if is_skip(q):
             # Keep skips / already-ok entries as is.
-            qs_ok.append(q)
+            qs_ok.add(q)
             continue
 
         done += 1
@@ -128,13 +131,13 @@ def main(argv: list[str] | None = None) -> int:
             error(q, "no reference tokens for numbered lines")
             continue
 
-        if not (0 <= gemini.chat_count < args.interval):
-            gemini.init(args.model, history, think=args.think)
+        if chat.count >= args.interval:
+            chat.reset()
 
         skeleton = build_skeleton_table(header, expected_tokens)
         prompt = build_prompt([raw for _ln, _text, raw in numbered], skeleton)
 
-        qq = gemini.query(
+        qq = chat.query(
             prompt,
             info=q.info,
             show=args.show,
@@ -144,12 +147,13 @@ def main(argv: list[str] | None = None) -> int:
         if qq.result:
             qq.result = common.fix_table(qq.result) or qq.result
             qq.error = None
-            qs_ok.append(qq)
-            common.write_queries(ok_path, qs_ok, count=len(qs_ok))
+            qs_ok.add(qq)
         else:
             error(qq)
 
-    print(f"OK: {len(qs_ok)}, NG: {len(qs_ng)}", file=sys.stderr)
+    qs_ok.close(count=qs_ok.count)
+    qs_ng.close(error=qs_ng.errors, count=qs_ng.count)
+    print(f"OK: {qs_ok.count}, NG: {qs_ng.count}", file=sys.stderr)
     return 0
 
 if __name__ == "__main__":
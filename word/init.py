@@ -1,4 +1,5 @@
 import argparse
+from dantetool import cache
 
 parser = argparse.ArgumentParser(
     description="Initialize word table generation using Gemini",
@@ -19,6 +20,7 @@ parser.add_argument("-m", dest="model", required=True,
                     help="model to use")
 parser.add_argument("--no-think", dest="think", action="store_false", default=None,
                     help="don't include thoughts in response")
+cache.add_args(parser)
 parser.add_argument("language", help="target language")
 parser.add_argument("srcdir", help="source directory")
 
@@ -33,6 +35,7 @@ model = args.model
 think = args.think
 language = args.language
 srcdir = args.srcdir
+cache.apply(args)
 
 from dantetool import gemini, common
 
@@ -1,6 +1,9 @@
 import re
 import argparse
 from dantetool import common, option
+from dantetool.commands import strip
+
+tercets = 1
 
 parser = argparse.ArgumentParser(
     description="Create word tables using Gemini",
@@ -8,8 +11,11 @@ parser = argparse.ArgumentParser(
 
 option.interval = 5
 option.parse(parser)
+parser.add_argument("--tercets", dest="tercets", type=int, default=tercets,
+                    help=f"specify number of tercets per request (default: {tercets})")
 args = parser.parse_args()
 option.apply(args)
+tercets = args.tercets
 
 init_qs = common.read_queries(option.init)
 history = common.unzip(init_qs)
@@ -18,19 +24,94 @@ from dantetool import gemini
 
 gemini.generation_config["max_length"] = 8192
 
-@option.proc
-def proc(src, xml):
+executor = gemini.executor(option.model, history, think=option.think,
+                           interval=option.interval, workers=option.parallel * option.jobs,
+                           budget=option.history_tokens)
+
+prompt = "Create a word table."
+pack_prompt = prompt + " Before the rows of each tercet, add a row with only its first line number."
+
+def is_section(row):
+    return bool(re.fullmatch(r"\d+", row[0])) and not any(row[1:])
+
+def split_pack(result, starts, refs):
+    """Cut the table answering a pack into one table per tercet.
+
+    The section rows tell where each tercet starts; without any of them the
+    rows are handed out by the number of reference tokens of each tercet.
+    Returns the table for each tercet, None where it does not match."""
+    table = common.read_table(result or "")
+    if not table or len(table) < 3:
+        return [None] * len(starts)
+    head, rows = table[:2], table[2:]
+    sections = {}
+    current = None
+    for row in rows:
+        if is_section(row):
+            current = sections.setdefault(int(row[0]), [])
+        elif current is not None:
+            current.append(row)
+    if sections:
+        pieces = [sections.get(start) for start in starts]
+    else:
+        words = [row for row in rows if not is_section(row)
+                 and common.has_alpha(strip.fix_token(row[0]))]
+        pieces = []
+        for ref in refs:
+            n = len(ref[0]) if ref else 0
+            pieces.append(words[:n])
+            words = words[n:]
+    ret = []
+    for piece, ref in zip(pieces, refs):
+        if piece is None:
+            ret.append(None)
+            continue
+        t = common.table_to_string(head + piece)
+        cleaned = strip.clean_table(t)
+        if ref and cleaned and not strip.validate_table_with_reference(cleaned, ref):
+            ret.append(t)
+        else:
+            ret.append(None)
+    return ret
+
+async def send_packed(jobs, texts, canto, journal):
+    """Send `tercets` tercets per request and split the tables back into one
+    query per tercet.  Tercets that do not match the tokenize/ reference
+    are sent again on their own."""
+    refs = []
+    for p, info, _ in jobs:
+        q = common.query()
+        q.prompt = p
+        q.info = info
+        refs.append(strip.reference_tokens(q, canto))
+    packs = []
+    for i in range(0, len(jobs), tercets):
+        p = range(i, min(i + tercets, len(jobs)))
+        packs.append(((pack_prompt + "\n\n" + "\n\n".join(texts[j] for j in p), jobs[i][1], None), p))
+    def split(n, pq):
+        p = packs[n][1]
+        starts = [int(re.match(r"(\d+) ", texts[i]).group(1)) for i in p]
+        return split_pack(pq.result, starts, [refs[i] for i in p])
+    return await executor.apacked(jobs, packs, split, option.show, option.retry, journal)
+
+@option.aproc
+async def proc(src, xml):
     srcs, src_lines = common.read_source(src, option.language)
     lmax = max(src_lines)
-    qs = []
+    jobs = []
+    texts = []
     for lines in srcs:
         text = "\n".join(lines)
         if not (m := re.match(r"(\d+) ", text)):
             continue
-        if not (0 <= gemini.chat_count < option.interval):
-            gemini.init(option.model, history, think=option.think)
         info = f"[{option.info}] {m.group(1)}/{lmax}"
-        q = gemini.query("Create a word table.\n\n" + text, info, option.show, option.retry)
-        if q:
-            qs.append(q)
+        jobs.append((prompt + "\n\n" + text, info, None))
+        texts.append(text)
+    if option.batch:
+        executor.render(option.batch, jobs)
+        return
+    if tercets > 1 and (canto := strip.load_tokenized_canto(xml)):
+        qs = await send_packed(jobs, texts, canto, option.journal)
+    else:
+        qs = await executor.amap(jobs, option.show, option.retry, option.journal)
     common.write_queries(xml, qs, count=len(qs))